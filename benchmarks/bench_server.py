@@ -0,0 +1,99 @@
+'''
+Load generator for the prediction server in mlp/server.py.
+
+Opens 'clients' connections that each send 'requests' requests of 'rows'
+rows one after the other, and prints the latency percentiles and the
+throughput seen by the clients.
+
+Usage (from the top directory):
+    python3 benchmarks/bench_server.py --unix /tmp/mlp.sock --model NCAA_1_5
+    python3 benchmarks/bench_server.py --fake   # in-process numpy model
+'''
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.getcwd())
+from mlp.server import PredictionServer
+
+
+async def client(connect, model, n_feat, n_requests, n_rows, latencies):
+    reader, writer = await connect()
+    rng = np.random.RandomState(len(latencies))
+    for _ in range(n_requests):
+        request = {'model': model,
+                   'rows': rng.random_sample((n_rows, n_feat)).tolist()}
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode('utf-8') + b'\n')
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+    writer.close()
+
+
+async def run(args):
+    if args.fake:
+        # Logistic model doing the work of a forward pass in numpy
+        w = np.random.RandomState(0).randn(args.n_feat)
+        server = PredictionServer({args.model:
+                                   (lambda X: 1 / (1 + np.exp(-X.dot(w))),
+                                    args.n_feat)},
+                                  args.max_batch, args.max_wait_ms / 1000.0)
+        await server.start(args.host, args.port, args.unix)
+
+    if args.unix is not None:
+        connect = lambda: asyncio.open_unix_connection(args.unix)
+    else:
+        connect = lambda: asyncio.open_connection(args.host, args.port)
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[client(connect, args.model, args.n_feat,
+                                  args.requests, args.rows, latencies)
+                           for _ in range(args.clients)])
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000.0
+    print('clients: {}  requests: {}  rows/request: {}'.format(
+        args.clients, lat.size, args.rows))
+    print('p50: {:.2f} ms  p99: {:.2f} ms  max: {:.2f} ms'.format(
+        np.percentile(lat, 50), np.percentile(lat, 99), lat.max()))
+    print('throughput: {:.0f} requests/s, {:.0f} rows/s'.format(
+        lat.size / elapsed, lat.size * args.rows / elapsed))
+
+    # Server side counters
+    reader, writer = await connect()
+    writer.write(b'{"cmd": "stats"}\n')
+    print('server:', (await reader.readline()).decode('utf-8').strip())
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark mlp/server.py')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None)
+    parser.add_argument('--model', default='fake')
+    parser.add_argument('--n-feat', type=int, default=42)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='requests per client')
+    parser.add_argument('--rows', type=int, default=1,
+                        help='rows per request')
+    parser.add_argument('--fake', action='store_true',
+                        help='start a server with a numpy model in-process')
+    parser.add_argument('--max-batch', type=int, default=512)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+'''
+Measure how long it takes to start python and import a module.
+
+Every measurement runs in a fresh interpreter, so nothing is cached in
+sys.modules between runs.
+
+Usage:
+    python3 benchmarks/bench_startup.py [-n 10] [module ...]
+'''
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+# Paths searched for the modules, relative to the top directory
+search_path = ['data_processing', '.']
+
+default_modules = ['post_game_team_diff_generator', 'pandas']
+
+
+def time_import(module, n_run):
+    """ Time 'python -c "import module"' 'n_run' times
+
+    Input:
+      - @module: str
+           Name of the module to import. An empty string times a bare
+             interpreter start.
+      - @n_run: int
+           Number of runs.
+    Returns:
+      - A sorted list of wall times in seconds
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(search_path
+                                        + [env.get('PYTHONPATH', '')])
+    code = 'import ' + module if module else 'pass'
+    times = []
+    for _ in range(n_run):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code], env=env)
+        times.append(time.perf_counter() - start)
+    return sorted(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-n', type=int, default=10, help='runs per module')
+    parser.add_argument('modules', nargs='*', default=default_modules)
+    args = parser.parse_args()
+
+    print('{:<40}{:>10}{:>10}'.format('module', 'median', 'min'))
+    for module in [''] + args.modules:
+        times = time_import(module, args.n)
+        print('{:<40}{:>9.3f}s{:>9.3f}s'.format(module or '(interpreter)',
+                                               times[len(times) // 2],
+                                               times[0]))
+
+
+if __name__ == '__main__':
+    main()
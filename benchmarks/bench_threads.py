@@ -0,0 +1,94 @@
+'''
+Total training throughput of concurrent Mlp sessions on one computer.
+
+For each number of concurrent sessions, starts that many processes, each
+training its own model for 'steps' update steps (one row per step, as in
+Mlp.train_model), and prints the total number of steps per second. With
+'--budget', the cores are split between the sessions with mlp/scheduler.py;
+otherwise every session uses the default Tensorflow thread pools.
+
+Usage (from the top directory):
+    python3 benchmarks/bench_threads.py --sessions 1 2 4 8
+    python3 benchmarks/bench_threads.py --sessions 1 2 4 8 --budget
+'''
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+sys.path.insert(0, os.getcwd())
+from mlp import scheduler
+
+
+def session(args, budget, barrier, results):
+    from mlp.mlp import Mlp
+
+    m = Mlp('bench_threads', args.n_feat, args.n_hidden, args.n_node, 1,
+            args.n_train, pathToDataset=args.dataset, **budget)
+    m.new_model()
+    n_rows = m.X_train.shape[0]
+    barrier.wait()
+    start = time.perf_counter()
+    for step in range(args.steps):
+        i = step % n_rows
+        m.sess.run(m.train_step, feed_dict={m.X: m.X_train[i, None],
+                                            m.Y: m.Y_train[i, None]})
+    results.put(time.perf_counter() - start)
+
+
+def run(args, n_sessions):
+    if args.budget:
+        budgets = [scheduler.thread_budget(cpus, not args.no_pin)
+                   for cpus in scheduler.split_cpus(n_sessions)]
+        budgets = (budgets * n_sessions)[:n_sessions]
+    else:
+        budgets = [{}] * n_sessions
+    barrier = multiprocessing.Barrier(n_sessions + 1)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=session,
+                                         args=(args, budget, barrier,
+                                               results))
+                 for budget in budgets]
+    for p in processes:
+        p.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for _ in processes:
+        results.get()
+    wall = time.perf_counter() - start
+    for p in processes:
+        p.join()
+    return wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent Mlp '
+                                                 'sessions')
+    parser.add_argument('--sessions', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--budget', action='store_true',
+                        help='split the cores between the sessions')
+    parser.add_argument('--no-pin', action='store_true',
+                        help='with --budget, limit threads but do not pin')
+    parser.add_argument('--steps', type=int, default=20000,
+                        help='update steps per session')
+    parser.add_argument('--dataset', default='./mlp/fake_feature/feature.csv')
+    parser.add_argument('--n-feat', type=int, default=10)
+    parser.add_argument('--n-train', type=int, default=9000)
+    parser.add_argument('--n-hidden', type=int, default=2)
+    parser.add_argument('--n-node', type=int, default=10)
+    args = parser.parse_args()
+
+    print('cores: {}  budget: {}'.format(len(scheduler.available_cpus()),
+                                         args.budget))
+    print('sessions\tsteps/s\t\tsteps/s/session')
+    for n_sessions in args.sessions:
+        wall = run(args, n_sessions)
+        total = n_sessions * args.steps / wall
+        print('{}\t\t{:.0f}\t\t{:.0f}'.format(n_sessions, total,
+                                              total / n_sessions))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''
+Build the 42 pre-game features of any matchup on demand.
+
+This is the same computation as pre_game_teams_gen.py (players stats of the
+last season, new_player_stats for new players, team_stats_gen), but for one
+game at a time, with LRU caches of the per-player stats rows and per-roster
+team vectors.
+
+Usage:
+	from feature_service import FeatureService
+	service = FeatureService(norm_shift=m.norm_shift, norm_scale=m.norm_scale)
+	x = service.matchup(2018, roster_a, roster_b)   # rosters: PlayerIDs of 2018
+	m.predict_proba(x[None, :])
+'''
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+import pre_game_teams_gen
+
+class FeatureService(object):
+	def __init__(self, data=None, teams=None, new_player_stats=None,
+				 norm_shift=None, norm_scale=None, maxsize=8192):
+		'''
+		'data', 'teams' and 'new_player_stats' default to what
+		pre_game_teams_gen computes from data.csv. 'norm_shift' and
+		'norm_scale' are the normalization of the model (Mlp.norm_shift and
+		Mlp.norm_scale); features are not normalized if they are None.
+		'''
+		if data is None:
+			data, teams = pre_game_teams_gen.get_data()
+		if new_player_stats is None:
+			new_players_data = pre_game_teams_gen.new_players_data_gen(data)
+			new_player_stats = new_players_data.iloc[:,2:-1].mean().tolist()
+		# Row i holds the stats of player 600001 + i, as in pre_game_teams_gen
+		self.stats = data.iloc[:,2:-1].values.astype(np.float64)
+		self.teams = set(teams)
+		self.new_player_stats = np.array(new_player_stats, dtype=np.float64)
+		self.norm_shift = norm_shift
+		self.norm_scale = norm_scale
+		self.seasons = {}
+		self.player_stats = lru_cache(maxsize)(self._player_stats)
+		self.team_vector = lru_cache(maxsize)(self._team_vector)
+
+	def season(self, year):
+		'''
+		Name of every player of 'year' by ID, and ID of every player of
+		'year' - 1 by name (the first one if a name appears twice)
+		'''
+		if year not in self.seasons:
+			path = pre_game_teams_gen.path
+			this_year = pd.read_csv(path+'Players_'+str(year)+'.csv', sep=',')
+			last_year = pd.read_csv(path+'Players_'+str(year-1)+'.csv', sep=',')
+			names = dict(zip(this_year['PlayerID'].tolist(), this_year['PlayerName'].tolist()))
+			last_IDs = {}
+			for ID, name in zip(last_year['PlayerID'].tolist(), last_year['PlayerName'].tolist()):
+				last_IDs.setdefault(name, ID)
+			self.seasons[year] = (names, last_IDs)
+		return self.seasons[year]
+
+	def _player_stats(self, year, player_ID):
+		'''
+		Name and expected stats of a player in 'year': the stats of the player
+		with the same name in 'year' - 1, or new_player_stats
+		'''
+		names, last_IDs = self.season(year)
+		name = names[player_ID]
+		if name in last_IDs:
+			return name, self.stats[last_IDs[name]-600000-1]
+		return name, self.new_player_stats
+
+	def _team_vector(self, year, roster):
+		'''
+		team_stats_gen of a roster, given as a sorted tuple of PlayerIDs
+		'''
+		player_stats = {}
+		for ID in roster:
+			if ID not in self.teams:
+				name, stats = self.player_stats(year, ID)
+				player_stats[name] = stats
+		player_stats = np.array(list(player_stats.values()))
+		return player_stats[:,2:].sum(axis=0)/player_stats[:,0].sum()*200.0
+
+	def team(self, year, roster):
+		return self.team_vector(year, tuple(sorted(set(int(ID) for ID in roster))))
+
+	def matchup(self, year, roster_a, roster_b, normalize=True):
+		'''
+		Feature row of a game between the players 'roster_a' and 'roster_b' of
+		'year', normalized like the training set unless 'normalize' is False
+		'''
+		x = np.concatenate([self.team(year, roster_a), self.team(year, roster_b)])
+		if normalize and self.norm_shift is not None:
+			x = (x - self.norm_shift) / self.norm_scale
+		return x
+
+	def cache_info(self):
+		return {'player_stats': self.player_stats.cache_info(),
+				'team_vector': self.team_vector.cache_info()}
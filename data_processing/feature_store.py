@@ -0,0 +1,83 @@
+'''
+Season-partitioned storage for generated features.
+
+Every season is saved to its own CSV file under a store directory, together
+with a manifest.json that records the hashes of the inputs used to compute
+it. A season only has to be recomputed when one of its input hashes changes.
+'''
+
+import os
+import csv
+import json
+import hashlib
+
+MANIFEST = 'manifest.json'
+
+def file_hash(filepath, block_size=1 << 20):
+	'''
+	Return the sha1 hex digest of the content of 'filepath'
+	'''
+	h = hashlib.sha1()
+	with open(filepath, 'rb') as f:
+		for block in iter(lambda: f.read(block_size), b''):
+			h.update(block)
+	return h.hexdigest()
+
+def value_hash(value):
+	'''
+	Return the sha1 hex digest of the repr of a python value, e.g. a list of
+	floats used as a parameter of the computation
+	'''
+	return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()
+
+def frame_hash(df):
+	'''
+	Return the sha1 hex digest of the values and index of a DataFrame, e.g.
+	the rows of a larger table a partition is computed from
+	'''
+	import pandas as pd
+	return hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()
+
+def load_manifest(store):
+	filepath = os.path.join(store, MANIFEST)
+	if not os.path.isfile(filepath):
+		return {}
+	with open(filepath, 'r') as f:
+		return json.load(f)
+
+def save_manifest(store, manifest):
+	# Write to a temporary file first so an interrupted run never leaves a
+	# half written manifest behind
+	filepath = os.path.join(store, MANIFEST)
+	with open(filepath + '.tmp', 'w') as f:
+		json.dump(manifest, f, indent=1, sort_keys=True)
+	os.replace(filepath + '.tmp', filepath)
+
+def partition_path(store, season):
+	return os.path.join(store, 'season_' + str(season) + '.csv')
+
+def is_stale(store, manifest, season, key):
+	'''
+	A season is stale if its partition is missing or if it was computed from
+	inputs with different hashes. 'key' is a dict of input name -> hash.
+	'''
+	if not os.path.isfile(partition_path(store, season)):
+		return True
+	return manifest.get(str(season)) != key
+
+def write_partition(store, season, header, rows):
+	filepath = partition_path(store, season)
+	with open(filepath + '.tmp', 'w') as outcsv:
+		writer = csv.writer(outcsv)
+		writer.writerow(header)
+		writer.writerows(rows)
+	os.replace(filepath + '.tmp', filepath)
+
+def read_partition(store, season):
+	'''
+	Return the rows of a season partition (header excluded) as lists of str
+	'''
+	with open(partition_path(store, season), 'r') as incsv:
+		reader = csv.reader(incsv)
+		next(reader)
+		return list(reader)
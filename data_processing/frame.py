@@ -3,6 +3,17 @@ Frame play-by-play row data files.
 
 Usage:
 	Change path1 to be the path of your event file, and path2 to be that of players file.
+
+	With a state file, the per-player totals are kept between runs and only
+	the Events/Players rows appended since the last run are read:
+	python3 frame.py --root ./NCAA_data/ --output ./NCAA_data/data.csv --state ./NCAA_data/data_state.pkl
+	Events rows must be appended one whole game at a time. A last row without
+	a trailing newline is read on the next run, and if a file was changed
+	other than by appending rows to it, the totals are rebuilt from scratch.
+
+	With a memory budget, the Events files are parsed a chunk at a time
+	instead of a season at a time:
+	python3 frame.py --root ./NCAA_data/ --output ./NCAA_data/data.csv --memory 2G
 '''
 root = '/../NCAA_data/'
 
@@ -13,52 +24,111 @@ header = ['player_ID', 'season', 'time', 'n_match', 'miss2_lay', 'reb_off', \
 			'made2_lay', 'timeout', 'reb_dead', 'made2_tip', 'miss2_dunk', \
 			'miss2_tip', 'foul_tech', 'name']
 
-from readFile import readFile
-
 import os
 import csv
+import pickle
+import hashlib
+import argparse
 
-def makeDataCsv():
-	curr = 0
-	process = 0
+import resources
 
-	print("Start reading CSV files...")
-	events = []
-	players = []
-	for i in range(9):
-		year = 2010 + i
-		print("File " + str(year) + '...')
-		filepath = root + '/Events_' + str(year) + '.csv'
-		events.extend(readFile(filepath))
-		filepath = root + '/Players_' + str(year) + '.csv'
-		players.extend(readFile(filepath))
-
-	offset = int(players[0][0])
-	divisor = round(len(events) / 100)
-	# Initialize empty cells with the first column is player ID
-	lines = []
-	for elm in players:
-		if elm[0] == '648095':
-			for i in range(642767, 648095):
-				line = [i]
-				line.extend([0] * 28)
-				lines.append(line)
-		line = [elm[0], elm[1]]
-		line.extend([0] * 26)
-		line.append(elm[3])
-		lines.append(line)
+years = range(2010, 2019)
+
+def parseRows(content, offset):
+	lines = content.decode('utf-8').splitlines()
+	if offset == 0:
+		lines = lines[1:]
+	return list(csv.reader(lines))
+
+def readNewRows(path, offset, hold_tail=False, digest=None):
+	'''
+	Read the rows of a csv file after byte 'offset', skipping the header if
+	'offset' is 0. A last row without a trailing newline is a row too, unless
+	'hold_tail' is set: then it is left to be read with the rows appended
+	after it.
+	'digest' (a hashlib object), if given, is updated with the bytes read.
+	Returns the rows and the offset of the end of the last row read.
+	'''
+	with open(path, 'rb') as file:
+		file.seek(offset)
+		content = file.read()
+	end = content.rfind(b'\n') + 1 if hold_tail else len(content)
+	if digest is not None:
+		digest.update(content[:end])
+	return parseRows(content[:end], offset), offset + end
+
+def readRowChunks(path, offset, chunk_size=None, hold_tail=False, digest=None):
+	'''
+	Like readNewRows, but yield the rows a chunk of about 'chunk_size' bytes
+	at a time (all at once if None), with the offset of the end of the chunk
+	'''
+	if chunk_size is None:
+		yield readNewRows(path, offset, hold_tail, digest)
+		return
+	with open(path, 'rb') as file:
+		file.seek(offset)
+		rest = b''
+		while True:
+			content = file.read(chunk_size)
+			if not content:
+				break
+			content = rest + content
+			end = content.rfind(b'\n') + 1
+			rest = content[end:]
+			if digest is not None:
+				digest.update(content[:end])
+			rows = parseRows(content[:end], offset)
+			offset += end
+			yield rows, offset
+	# The file does not end with a newline
+	if rest and not hold_tail:
+		if digest is not None:
+			digest.update(rest)
+		rows = parseRows(rest, offset)
+		yield rows, offset + len(rest)
+
+def prefixDigest(path, size):
+	'''
+	sha1 (a hashlib object) of the first 'size' bytes of a file, None if the
+	file is missing or shorter
+	'''
+	if not os.path.isfile(path):
+		return None
+	digest = hashlib.sha1()
+	with open(path, 'rb') as file:
+		while size > 0:
+			block = file.read(min(size, 1 << 20))
+			if not block:
+				return None
+			digest.update(block)
+			size -= len(block)
+	return digest
+
+def splitGames(events):
+	'''
+	Split events into games: a game ends when the time goes backwards, or
+	with the last event
+	'''
+	games = []
+	first = 0
+	for curr in range(len(events)):
+		if curr + 1 == len(events) or int(events[curr][7]) > int(events[curr + 1][7]):
+			games.append(events[first:curr + 1])
+			first = curr + 1
+	return games
+
+def ingestGame(game, lines):
+	'''
+	Add the events of one game to the per-player totals in 'lines', a dict
+	of player ID -> row of data.csv
+	'''
 	# Store player ID and initial time of who are playing on the field
-	print("Start processing event file...")
 	hasPlayed = []
 	playerID = []
 	start = []
-	for event in events:
-		# Print complete ratio of the process
-		if not round(curr / divisor) == process:
-			process = round(curr / divisor)
-			print('Process complete: ', process, '%')
+	for event in game:
+		row = int(event[9])
 		# If event type is sub_in, record
-		row = int(event[9]) - offset
 		if event[10] == 'sub_in':
 			if not event[9] in hasPlayed:
 				hasPlayed.append(event[9])
@@ -77,11 +147,6 @@ def makeDataCsv():
 				lines[row][2] += int(event[7])
 		else:
 			# The player has been on the field from the beginning
-			# if not event[9] in hasPlayed:
-			# 	hasPlayed.append(event[9])
-			# if not event[9] in playerID:
-			# 	playerID.append(event[9])
-			# 	start.append(0)
 			if event[9] in hasPlayed:
 				if not event[9] in playerID:
 					playerID.append(event[9])
@@ -92,26 +157,148 @@ def makeDataCsv():
 				start.append(0)
 			column = header.index(event[10])
 			lines[row][column] += 1
-		# Check if it is the last event for a match. Empty playerID and start if it is
-		if curr + 1 == len(events) or int(event[7]) > int(events[curr + 1][7]):
-			while hasPlayed:
-				lines[int(hasPlayed[0]) - offset][3] += 1
-				hasPlayed.pop(0)
-			while playerID:
-				lines[int(playerID[0]) - offset][2] += max(2400, int(event[7])) - start[0]
-				playerID.pop(0)
-				start.pop(0)
-		curr += 1
-
-	# Write to a new csv file
-	if not os.path.isfile('data.csv'):
-		with open('data.csv', 'w') as outcsv:
-			writer = csv.writer(outcsv)
-			writer.writerow(header)
-			writer.writerows(lines)
+	# Last event of the match: count the match and the time on the field
+	while hasPlayed:
+		lines[int(hasPlayed[0])][3] += 1
+		hasPlayed.pop(0)
+	while playerID:
+		lines[int(playerID[0])][2] += max(2400, int(event[7])) - start[0]
+		playerID.pop(0)
+		start.pop(0)
+
+def newState():
+	# 'offsets' holds how many bytes of each input file were already read,
+	# and 'prefixes' the sha1 of these bytes
+	return {'lines': {}, 'offsets': {}, 'prefixes': {}}
+
+def loadState(state_path):
+	if state_path is None or not os.path.isfile(state_path):
+		return newState()
+	with open(state_path, 'rb') as f:
+		return pickle.load(f)
+
+def saveState(state, state_path):
+	with open(state_path + '.tmp', 'wb') as f:
+		pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+	os.replace(state_path + '.tmp', state_path)
+
+def checkState(state):
+	'''
+	sha1 (hashlib objects) of the bytes of every file read into 'state', or
+	None if one of them was changed other than by appending rows to it
+	'''
+	digests = {}
+	prefixes = state.get('prefixes', {})
+	for filepath, offset in state['offsets'].items():
+		digest = prefixDigest(filepath, offset)
+		if digest is None or digest.hexdigest() != prefixes.get(filepath):
+			print(filepath + ' changed since the last run, reading all the files again.')
+			return None
+		digests[filepath] = digest
+	return digests
+
+def updateState(state, root=root, years=years, chunk_size=None, hold_tail=False):
+	'''
+	Read the rows of the Players and Events files added since the offsets
+	saved in 'state', and add them to the per-player totals. If a file was
+	rewritten instead, the totals are rebuilt from all the files.
+	Events files are read 'chunk_size' bytes at a time (whole if None).
+	With 'hold_tail', a last row without a trailing newline is left for the
+	next update, as it may still be being written.
+	Returns the number of new events.
+	'''
+	digests = checkState(state)
+	if digests is None:
+		state.clear()
+		state.update(newState())
+		digests = {}
+	lines = state['lines']
+	offsets = state['offsets']
+	prefixes = state['prefixes']
+	n_events = 0
+	for year in years:
+		filepath = root + '/Players_' + str(year) + '.csv'
+		if not os.path.isfile(filepath):
+			continue
+		print("File " + str(year) + '...')
+		digest = digests.get(filepath, hashlib.sha1())
+		players, offsets[filepath] = readNewRows(filepath, offsets.get(filepath, 0), hold_tail, digest)
+		prefixes[filepath] = digest.hexdigest()
+		# Initialize empty cells with the first column is player ID
+		for elm in players:
+			if int(elm[0]) not in lines:
+				line = [elm[0], elm[1]]
+				line.extend([0] * 26)
+				line.append(elm[3])
+				lines[int(elm[0])] = line
+
+		filepath = root + '/Events_' + str(year) + '.csv'
+		if not os.path.isfile(filepath):
+			continue
+		# The last game of a chunk may go on in the next chunk
+		pending = []
+		digest = digests.get(filepath, hashlib.sha1())
+		for events, offset in readRowChunks(filepath, offsets.get(filepath, 0), chunk_size,
+				hold_tail, digest):
+			games = splitGames(pending + events)
+			pending = games.pop() if games else []
+			for game in games:
+				ingestGame(game, lines)
+			offsets[filepath] = offset
+			n_events += len(events)
+		prefixes[filepath] = digest.hexdigest()
+		if pending:
+			ingestGame(pending, lines)
+	return n_events
+
+def writeDataCsv(lines, outpath):
+	'''
+	Write the totals ordered by player ID. IDs without a player get a row of
+	zeros, so that a player's row is always at ID - first ID.
+	'''
+	IDs = sorted(lines)
+	with open(outpath, 'w') as outcsv:
+		writer = csv.writer(outcsv)
+		writer.writerow(header)
+		for ID in range(IDs[0], IDs[-1] + 1):
+			if ID in lines:
+				writer.writerow(lines[ID])
+			else:
+				writer.writerow([ID] + [0] * 28)
+
+def makeDataCsv(root=root, outpath='data.csv', overwrite=False, state_path=None, memory=None):
+	'''
+	Sum up the stats of every player of 2010-2018 from the Events and Players
+	files under 'root' and write them to 'outpath'.
+	An existing 'outpath' is kept unless 'overwrite' is set.
+	If 'state_path' is given, the totals are loaded from and saved to it, so
+	that only the rows added since the last run are processed.
+	'memory' is a budget such as '2G' that sets the size of the chunks of the
+	Events files; without it, each file is read at once.
+	'''
+	if not overwrite and os.path.isfile(outpath):
+		return
+	state = loadState(state_path)
+	print("Start processing event files...")
+	with resources.measure('frame events', memory) as usage:
+		usage.rows = updateState(state, root, chunk_size=resources.chunk_bytes(memory),
+			hold_tail=state_path is not None)
+	print(usage.rows, 'new events.')
+	if state_path is not None:
+		saveState(state, state_path)
+	with resources.measure('frame write', memory) as usage:
+		writeDataCsv(state['lines'], outpath)
+		usage.rows = len(state['lines'])
 
 def main():
-	makeDataCsv()
+	parser = argparse.ArgumentParser(description='Sum up players stats into data.csv')
+	parser.add_argument('--root', default=root, help='directory of the Events and Players files')
+	parser.add_argument('-o', '--output', default='data.csv')
+	parser.add_argument('--state', default=None, help='file keeping the totals between runs')
+	parser.add_argument('--memory', default=None, help='memory budget, e.g. 2G')
+	args = parser.parse_args()
+	makeDataCsv(args.root, args.output, overwrite=args.state is not None, state_path=args.state,
+		memory=args.memory)
 
 if __name__ == '__main__':
 	main()
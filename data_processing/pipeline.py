@@ -0,0 +1,243 @@
+'''
+Run the chain raw data -> features -> model as a small DAG of stages.
+
+Each stage declares the files it reads and writes. A stage is skipped when
+the content hashes of its inputs and its parameters are the same as on its
+last successful run and its outputs still exist. Stages whose inputs do not
+depend on each other run at the same time, each in its own process, and the
+time spent in every stage is reported at the end.
+
+Usage (from the top directory):
+	python3 data_processing/pipeline.py [-j N] [--force] [stage ...]
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from multiprocessing.connection import wait
+
+import feature_store
+
+path = './NCAA_data/'
+output = './data_processing/output/'
+state_path = output + 'pipeline_state.json'
+
+class Stage(object):
+	def __init__(self, name, func, inputs, outputs, params=None, options=None):
+		'''
+		'func' is called with 'params' and 'options' as keyword arguments in a
+		child process. It must be a module level function so that it can be
+		run there. 'params' change the outputs and are part of the key of the
+		stage; 'options' (number of workers, memory budget...) only change how
+		the stage runs and are not.
+		'''
+		self.name = name
+		self.func = func
+		self.inputs = list(inputs)
+		self.outputs = list(outputs)
+		self.params = params or {}
+		self.options = options or {}
+
+class Pipeline(object):
+	def __init__(self, stages, state_path=state_path):
+		self.stages = {stage.name: stage for stage in stages}
+		self.order = [stage.name for stage in stages]
+		self.state_path = state_path
+		self.state = {'stages': {}, 'files': {}}
+		if os.path.isfile(state_path):
+			with open(state_path, 'r') as f:
+				self.state = json.load(f)
+		# A stage depends on the stages that write one of its inputs
+		producer = {}
+		for stage in stages:
+			for out in stage.outputs:
+				producer[out] = stage.name
+		self.deps = {stage.name: sorted(set(producer[f] for f in stage.inputs if f in producer))
+					 for stage in stages}
+
+	def save_state(self):
+		directory = os.path.dirname(self.state_path)
+		if directory and not os.path.isdir(directory):
+			os.makedirs(directory)
+		with open(self.state_path + '.tmp', 'w') as f:
+			json.dump(self.state, f, indent=1, sort_keys=True)
+		os.replace(self.state_path + '.tmp', self.state_path)
+
+	def file_hash(self, filepath):
+		'''
+		Content hash of a file; the hash is reused as long as the size and the
+		modification time of the file do not change
+		'''
+		st = os.stat(filepath)
+		stamp = [st.st_size, st.st_mtime]
+		known = self.state['files'].get(filepath)
+		if known is not None and known[:2] == stamp:
+			return known[2]
+		h = feature_store.file_hash(filepath)
+		self.state['files'][filepath] = stamp + [h]
+		return h
+
+	def key(self, stage):
+		missing = [f for f in stage.inputs if not os.path.isfile(f)]
+		if missing:
+			raise IOError('stage ' + stage.name + ' is missing its inputs: ' + ', '.join(missing))
+		return {'inputs': {f: self.file_hash(f) for f in stage.inputs},
+				'params': feature_store.value_hash(sorted(stage.params.items()))}
+
+	def up_to_date(self, stage, key):
+		return (self.state['stages'].get(stage.name) == key
+				and all(os.path.isfile(f) for f in stage.outputs))
+
+	def upstream(self, targets):
+		'''
+		The stages needed to build 'targets', in declaration order
+		'''
+		needed = set()
+		todo = list(targets)
+		while todo:
+			name = todo.pop()
+			if name not in needed:
+				needed.add(name)
+				todo.extend(self.deps[name])
+		return [name for name in self.order if name in needed]
+
+	def run(self, targets=None, max_workers=1, force=False):
+		'''
+		Run 'targets' (all stages by default) and the stages they depend on,
+		at most 'max_workers' at the same time.
+		Returns a dict of stage name -> (status, seconds).
+		'''
+		pending = self.upstream(targets or self.order)
+		running = {}
+		report = {}
+		failed = False
+		while pending or running:
+			# Start every stage whose dependencies are done
+			for name in list(pending):
+				if failed or len(running) >= max_workers:
+					break
+				active = [stage_name for stage_name, _, _, _ in running.values()]
+				if any(dep in pending or dep in active for dep in self.deps[name]):
+					continue
+				pending.remove(name)
+				stage = self.stages[name]
+				try:
+					key = self.key(stage)
+				except IOError as e:
+					print('[%s] %s' % (name, e))
+					failed = True
+					report[name] = ('failed', 0.0)
+					continue
+				if not force and self.up_to_date(stage, key):
+					report[name] = ('skipped', 0.0)
+					print('[%s] up to date' % name)
+					continue
+				print('[%s] running' % name)
+				process = multiprocessing.Process(target=stage.func, kwargs=dict(stage.params, **stage.options),
+												  name=name)
+				process.start()
+				running[process.sentinel] = (name, process, key, time.time())
+			if not running:
+				if failed:
+					break
+				continue
+
+			for sentinel in wait(list(running)):
+				name, process, key, start = running.pop(sentinel)
+				process.join()
+				elapsed = time.time() - start
+				if process.exitcode == 0:
+					# Outputs of this stage may be inputs of the next ones
+					for f in self.stages[name].outputs:
+						self.state['files'].pop(f, None)
+					self.state['stages'][name] = key
+					self.save_state()
+					report[name] = ('done', elapsed)
+					print('[%s] done in %.1fs' % (name, elapsed))
+				else:
+					failed = True
+					report[name] = ('failed', elapsed)
+					print('[%s] failed with exit code %s' % (name, process.exitcode))
+		self.save_state()
+		for name in pending:
+			report[name] = ('not run', 0.0)
+		return report
+
+# Stage functions; imports are done in the child process so that loading
+# the runner stays cheap
+
+def run_frame(root=path, outpath=path+'data.csv', memory=None):
+	import frame
+	frame.makeDataCsv(root, outpath, overwrite=True, memory=memory)
+
+def run_pre_game_teams(n_jobs=1, memory=None):
+	import pre_game_teams_gen
+	pre_game_teams_gen.main(n_jobs, memory)
+
+def run_post_game(first=2003, last=2010):
+	import post_game_team_diff_generator
+	post_game_team_diff_generator.generate(seasons=range(first, last + 1), force=True)
+
+def run_remove_outlier(n_sample=None, n_jobs=1):
+	import remove_outlier
+	remove_outlier.remove_outlier(output, n_sample, n_jobs)
+
+def run_mlp(model_name='NCAA', n_feat=42, n_hidden=1, n_node=5, n_epoch=100, train_frac=0.8, r_l=0.1):
+	sys.path.insert(0, '.')
+	import pandas as pd
+	from mlp.mlp import Mlp
+	dataset = path + 'pre_game_teams.csv'
+	n_rows = pd.read_csv(dataset, usecols=[0]).shape[0]
+	# train_model appends to the datapoints file, start a new one
+	datapoints = '_'.join(['./mlp/datapoints/' + model_name, str(n_hidden), str(n_node), 'compact.csv'])
+	if os.path.isfile(datapoints):
+		os.remove(datapoints)
+	m = Mlp(model_name, n_feat, n_hidden, n_node, n_epoch, int(n_rows * train_frac),
+			pathToDataset=dataset, r_l=r_l)
+	m.new_model()
+	m.train_model(epoch_start=0)
+
+def default_stages(n_jobs=1, mlp_params=None, memory=None):
+	events = [path + 'Events_' + str(year) + '.csv' for year in range(2010, 2019)]
+	players = [path + 'Players_' + str(year) + '.csv' for year in range(2010, 2019)]
+	mlp_params = dict(mlp_params or {})
+	mlp_params.setdefault('model_name', 'NCAA')
+	mlp_params.setdefault('n_hidden', 1)
+	mlp_params.setdefault('n_node', 5)
+	datapoints = '_'.join(['./mlp/datapoints/' + mlp_params['model_name'],
+						   str(mlp_params['n_hidden']), str(mlp_params['n_node']), 'compact.csv'])
+	return [
+		Stage('data', run_frame, events + players, [path + 'data.csv'], options={'memory': memory}),
+		Stage('pre_game_teams', run_pre_game_teams, [path + 'data.csv'] + events[1:] + players,
+			  [path + 'pre_game_teams.csv'], options={'n_jobs': n_jobs, 'memory': memory}),
+		Stage('post_game', run_post_game, [path + 'RegularSeasonDetailedResults.csv'],
+			  [output + 'post_game_team_diff.csv']),
+		Stage('remove_outlier', run_remove_outlier, [output + 'post_game_team_diff.csv'],
+			  [output + 'post_game_team_diff_removed_outlier.csv'], options={'n_jobs': n_jobs}),
+		Stage('mlp', run_mlp, [path + 'pre_game_teams.csv'], [datapoints], mlp_params),
+	]
+
+def main():
+	parser = argparse.ArgumentParser(description='Run the data processing and training stages')
+	parser.add_argument('stages', nargs='*', help='stages to build (default: all)')
+	parser.add_argument('-j', '--jobs', type=int, default=1, help='number of stages run at the same time')
+	parser.add_argument('--stage-jobs', type=int, default=1, help='number of workers inside a stage')
+	parser.add_argument('--force', action='store_true', help='run the stages even if they are up to date')
+	parser.add_argument('--memory', default=None, help='memory budget of the feature stages, e.g. 4G')
+	args = parser.parse_args()
+
+	pipeline = Pipeline(default_stages(args.stage_jobs, memory=args.memory))
+	report = pipeline.run(args.stages, args.jobs, args.force)
+	print()
+	print('%-16s%-10s%10s' % ('stage', 'status', 'seconds'))
+	for name in pipeline.order:
+		if name in report:
+			status, seconds = report[name]
+			print('%-16s%-10s%10.1f' % (name, status, seconds))
+	if any(status == 'failed' for status, _ in report.values()):
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -1,42 +1,91 @@
+'''
+Compute post-game team features from RegularSeasonDetailedResults.csv and
+output them to post_game_team_diff.csv
+
+Usage:
+	python3 data_processing/post_game_team_diff_generator.py [--first 2003] [--last 2010] [--all] [--force]
+
+numpy and pandas are only imported when the games are processed, so
+importing this module is cheap and has no side effects.
+'''
 import os
-import pandas as pd 
-import numpy as np 
-from keras.models import Sequential
-from keras.layers import Dense
-from keras.utils import np_utils
+
+games_path = './NCAA_data/RegularSeasonDetailedResults.csv'
+output_path = './data_processing/output/post_game_team_diff.csv'
 
 output_class = [1, 0]
 
-all_games = pd.read_csv('./NCAA_data/RegularSeasonDetailedResults.csv', sep=',')
-
-all_games['WFGM'] = all_games['WFGM'].div(all_games['WFGA'], axis = 0)*100.0
-all_games['WFGM3'] = all_games['WFGM3'].div(all_games['WFGA3'], axis = 0)*100.0
-all_games['WFTM'] = all_games['WFTM'].div(all_games['WFTA'], axis = 0)*100.0
-all_games['LFGM'] = all_games['LFGM'].div(all_games['LFGA'], axis = 0)*100.0
-all_games['LFGM3'] = all_games['LFGM3'].div(all_games['LFGA3'], axis = 0)*100.0
-all_games['LFTM'] = all_games['LFTM'].div(all_games['LFTA'], axis = 0)*100.0
-all_games = all_games.rename(columns = {'WFGM':'WFGP', 'WFGM3': 'WFG3P', 'WFTM': 'WFTP', 'LFGM':'LFGP', 'LFGM3': 'LFG3P', 'LFTM': 'LFTP'}).drop(['WFGA', 'WFGA3', 'WFTA', 'LFGA', 'LFGA3','LFTA'], axis = 1)
-
-games_2003 = all_games[all_games['Season'] == 2003]
-games_2004 = all_games[all_games['Season'] == 2004]
-games_2005 = all_games[all_games['Season'] == 2005]
-games_2006 = all_games[all_games['Season'] == 2006]
-games_2007 = all_games[all_games['Season'] == 2007]
-games_2008 = all_games[all_games['Season'] == 2008]
-games_2009 = all_games[all_games['Season'] == 2009]
-games_2010 = all_games[all_games['Season'] == 2010]
-
-
-#pre-process data
-if not os.path.isfile('./data_processing/output/post_game_team_diff.csv'):
-	#training and testing set
-	games_from_2003_to_2010 = []
-	for games in [games_2003, games_2004, games_2005, games_2006, games_2007, games_2008, games_2009, games_2010]:
-		for i in range(games.shape[0]):
-			diff_stats = np.array(games.iloc[i,8:18])-np.array(games.iloc[i,18:])
-			games_from_2003_to_2010.append(diff_stats.tolist()+[output_class[0]])
-			games_from_2003_to_2010.append((-1 * diff_stats).tolist()+[output_class[1]])
-				
-	games_from_2003_to_2010 = pd.DataFrame(games_from_2003_to_2010, columns = ['FG%_diff', '3P%_diff', 'FT%_diff', 'OR_diff', 'DR_diff', 'AST_diff', 'TO_diff', 'STL_diff','BLK_diff', 'PF_diff', 'W/L']).dropna()
-	games_from_2003_to_2010.to_csv('./data_processing/output/post_game_team_diff.csv', sep=',')
+diff_columns = ['FG%_diff', '3P%_diff', 'FT%_diff', 'OR_diff', 'DR_diff', 'AST_diff', 'TO_diff', 'STL_diff','BLK_diff', 'PF_diff']
+stats_columns = ['FGP', 'FG3P', 'FTP', 'OR', 'DR', 'Ast', 'TO', 'Stl', 'Blk', 'PF']
+
+def load_games(filepath=games_path):
+	'''
+	Read the detailed results and turn made/attempted shots into percentages
+	'''
+	import pandas as pd
+
+	all_games = pd.read_csv(filepath, sep=',')
+
+	all_games['WFGM'] = all_games['WFGM'].div(all_games['WFGA'], axis = 0)*100.0
+	all_games['WFGM3'] = all_games['WFGM3'].div(all_games['WFGA3'], axis = 0)*100.0
+	all_games['WFTM'] = all_games['WFTM'].div(all_games['WFTA'], axis = 0)*100.0
+	all_games['LFGM'] = all_games['LFGM'].div(all_games['LFGA'], axis = 0)*100.0
+	all_games['LFGM3'] = all_games['LFGM3'].div(all_games['LFGA3'], axis = 0)*100.0
+	all_games['LFTM'] = all_games['LFTM'].div(all_games['LFTA'], axis = 0)*100.0
+	all_games = all_games.rename(columns = {'WFGM':'WFGP', 'WFGM3': 'WFG3P', 'WFTM': 'WFTP', 'LFGM':'LFGP', 'LFGM3': 'LFG3P', 'LFTM': 'LFTP'}).drop(['WFGA', 'WFGA3', 'WFTA', 'LFGA', 'LFGA3','LFTA'], axis = 1)
+	return all_games
+
+def post_game_diff(games, seasons=range(2003, 2011)):
+	'''
+	Build the W-L stats difference of every game in 'seasons' (every season
+	of 'games' if None). Each game gives two rows: the W-L difference labelled
+	output_class[0], directly followed by its negation labelled output_class[1].
+	Rows with missing stats are dropped.
+	'''
+	import numpy as np
+	import pandas as pd
+
+	if seasons is not None:
+		games = games[games['Season'].isin(list(seasons))]
+	# Stable sort keeps the file order of the games within a season
+	games = games.sort_values('Season', kind='mergesort')
+	diff = games[['W' + c for c in stats_columns]].values - games[['L' + c for c in stats_columns]].values
+	# Interleave (diff, -diff) so that the rows are ordered game by game
+	diff = np.stack([diff, -diff], axis=1).reshape(-1, len(stats_columns))
+	diff_table = pd.DataFrame(diff, columns = diff_columns)
+	diff_table['W/L'] = np.tile(output_class, games.shape[0])
+	diff_table = diff_table.dropna()
+	# Counting stats stay integers once the rows with missing stats are gone
+	for diff_column, column in zip(diff_columns, stats_columns):
+		if np.issubdtype(games['W' + column].dtype, np.integer):
+			diff_table[diff_column] = diff_table[diff_column].astype(int)
+	return diff_table
+
+def generate(inpath=games_path, outpath=output_path, seasons=range(2003, 2011), force=False):
+	'''
+	Write the post-game diff table of 'seasons' to 'outpath'.
+	An existing output is kept unless 'force' is set.
+	'''
+	if os.path.isfile(outpath) and not force:
+		print(outpath, 'already exists, use --force to regenerate it.')
+		return
+	diff_table = post_game_diff(load_games(inpath), seasons)
+	diff_table.to_csv(outpath, sep=',')
+
+def main(argv=None):
+	import argparse
+
+	parser = argparse.ArgumentParser(description='Generate post_game_team_diff.csv')
+	parser.add_argument('-i', '--input', default=games_path)
+	parser.add_argument('-o', '--output', default=output_path)
+	parser.add_argument('--first', type=int, default=2003, help='first season')
+	parser.add_argument('--last', type=int, default=2010, help='last season')
+	parser.add_argument('--all', action='store_true', help='use every season in the input')
+	parser.add_argument('--force', action='store_true', help='overwrite an existing output')
+	args = parser.parse_args(argv)
+
+	seasons = None if args.all else range(args.first, args.last + 1)
+	generate(args.input, args.output, seasons, args.force)
 
+if __name__ == '__main__':
+	main()
@@ -2,10 +2,17 @@
 #output: features.csv
 import os
 import csv
+import argparse
+import itertools
+from multiprocessing import Pool
 import numpy as np
 import pandas as pd
 
+import feature_store
+import resources
+
 path = './NCAA_data/'
+store = path + 'pre_game_teams/'
 years = [2011, 2012, 2013, 2014, 2015, 2016, 2017, 2018]
 
 def get_data():
@@ -48,6 +55,12 @@ def team_stats_gen(player_stats):
 	team_stats = np.array(data.iloc[:,2:].sum())/Total_time_before_rescale*200.0
 	return team_stats
 
+def read_players(year):
+	'''
+	IDs and names of the players of 'year', the only columns used here
+	'''
+	return pd.read_csv(path+'Players_'+str(year)+'.csv', sep=',', usecols=['PlayerID', 'PlayerName'])
+
 def new_players_data_gen(data):
 	'''
 	To calculate the new player in year i,
@@ -56,10 +69,11 @@ def new_players_data_gen(data):
 	'''
 	all_new_players_data = []
 	index=[]
+	this_year_dataframe = read_players(years[0]-1)
 	for year in years:
-		this_year_dataframe = pd.read_csv(path+'Players_'+str(year)+'.csv', sep=',')
+		last_year_dataframe = this_year_dataframe
+		this_year_dataframe = read_players(year)
 		this_year_player_names = this_year_dataframe['PlayerName'].tolist()
-		last_year_dataframe = pd.read_csv(path+'Players_'+str(year-1)+'.csv', sep=',')
 		last_year_player_names = last_year_dataframe['PlayerName'].tolist()
 		this_year_new_players = list(set(this_year_player_names)-set(last_year_player_names))
 		for new_player in this_year_new_players:
@@ -68,82 +82,202 @@ def new_players_data_gen(data):
 	all_new_players_data = data.iloc[index]
 	return all_new_players_data
 
-def main():
-	output_features = ['sample_ID',
-					'a_miss2_lay', 'a_reb_off', 'a_made2_jump',
-					'a_miss2_jump', 'a_assist', 'a_made3_jump',
-					'a_block', 'a_reb_def', 'a_foul_pers',
-					'a_miss1_free', 'a_made1_free', 'a_miss3_jump',
-					'a_turnover', 'a_steal', 'a_made2_dunk',
-					'a_made2_lay', 'a_reb_dead', 'a_made2_tip',
-					'a_miss2_dunk', 'a_miss2_tip', 'a_foul_tech',
-					'b_miss2_lay', 'b_reb_off', 'b_made2_jump',
-					'b_miss2_jump', 'b_assist', 'b_made3_jump',
-					'b_block', 'b_reb_def', 'b_foul_pers',
-					'b_miss1_free', 'b_made1_free', 'b_miss3_jump',
-					'b_turnover', 'b_steal', 'b_made2_dunk',
-					'b_made2_lay', 'b_reb_dead', 'b_made2_tip',
-					'b_miss2_dunk', 'b_miss2_tip', 'b_foul_tech',
-					'win']
+stats_features = ['miss2_lay', 'reb_off', 'made2_jump',
+				'miss2_jump', 'assist', 'made3_jump',
+				'block', 'reb_def', 'foul_pers',
+				'miss1_free', 'made1_free', 'miss3_jump',
+				'turnover', 'steal', 'made2_dunk',
+				'made2_lay', 'reb_dead', 'made2_tip',
+				'miss2_dunk', 'miss2_tip', 'foul_tech']
+output_features = (['sample_ID'] + ['a_' + f for f in stats_features]
+				+ ['b_' + f for f in stats_features] + ['win'])
+# Season partitions always store the winner first
+partition_features = (['game'] + ['W_' + f for f in stats_features]
+				+ ['L_' + f for f in stats_features])
+
+def season_inputs(year):
+	return [path+'Events_'+str(year)+'.csv', path+'Players_'+str(year)+'.csv',
+			path+'Players_'+str(year-1)+'.csv']
+
+def season_key(year, data, teams, new_player_stats, file_hashes):
+	'''
+	Hashes of everything the features of 'year' are computed from: its
+	Events/Players files ('file_hashes' holds the hash of every file), the
+	rows of data.csv of the players of 'year' - 1, the team IDs of 'year' and
+	new_player_stats. Rows of data.csv of other seasons do not matter.
+	'''
+	key = {name: file_hashes[name] for name in season_inputs(year)}
+	# Players are looked up by their position in data, so the index is hashed
+	key['data'] = feature_store.frame_hash(data.loc[data['season'] == year-1])
+	year_teams = set(data.loc[data['season'] == year, 'player_ID'].tolist()) & set(teams)
+	key['teams'] = feature_store.value_hash(sorted(year_teams))
+	# new_player_stats is a mean taken in set order, so it is only stable up
+	# to rounding errors
+	key['new_player_stats'] = feature_store.value_hash([round(v, 9) for v in new_player_stats])
+	return key
+
+def season_games(year, data, teams, new_player_stats):
+	'''
+	Compute the expected team stats of both teams for every game in 'year',
+	using the players stats of 'year' - 1.
+	Returns a list of rows [game, W team stats..., L team stats...]
+	'''
+	print('Training games in %d... The input data are taken from players stats in %d.' % (year, year - 1))
+
+	players_last_year = read_players(year-1) #打开上一年的player的信息
+	players_this_year = read_players(year) #打开今年player的信息
+	this_year_player_IDs = players_this_year['PlayerID'].tolist() #每个ele的type是int
+	this_year_player_names = players_this_year['PlayerName'].tolist()
+	last_year_player_IDs = players_last_year['PlayerID'].tolist() #每个ele的type是int
+	last_year_player_names = players_last_year['PlayerName'].tolist()
+
+	#Calculating team members in each game in this year
+	#Events are read one game at a time: a game is a run of events with the
+	#same WTeamID and LTeamID. As before, the last game of the file is not used.
+	rows = []
+	with open(path+'Events_' + str(year) + '.csv', 'r') as incsv:
+		reader = csv.reader(incsv)
+		next(reader)
+		games = itertools.groupby(reader, key=lambda row: (row[3], row[4]))
+		game_j = list(next(games, (None, []))[1])
+		for j, (_, next_game) in enumerate(games):
+			W_ID = game_j[0][3]
+			L_ID = game_j[0][4]
+			W_players_ID = [] #each ele type should be int
+			L_players_ID = []
+			for k in range(len(game_j)):
+				if game_j[k][-3] == W_ID and int(game_j[k][-2]) not in teams and int(game_j[k][-2]) not in W_players_ID:
+						W_players_ID.append(int(game_j[k][-2]))
+				elif game_j[k][-3] == L_ID and int(game_j[k][-2]) not in teams and int(game_j[k][-2]) not in L_players_ID:
+					L_players_ID.append(int(game_j[k][-2]))
+
+			#Calculating WTeam stats
+			W_player_stats = player_stats_gen(W_players_ID, this_year_player_names, this_year_player_IDs, last_year_player_names, last_year_player_IDs, data, new_player_stats)
+			W_team_stats = team_stats_gen(W_player_stats)
+
+			#Calculating LTeam stats
+			L_player_stats = player_stats_gen(L_players_ID, this_year_player_names, this_year_player_IDs, last_year_player_names, last_year_player_IDs, data, new_player_stats)
+			L_team_stats = team_stats_gen(L_player_stats)
+
+			rows.append([j] + list(W_team_stats) + list(L_team_stats))
+			game_j = list(next_game)
+	print('There are', len(rows), 'games in year', year)
+	return rows
+
+# Inputs shared by the worker processes of update_store(n_jobs > 1)
+_worker_args = None
+
+def _init_worker(data, teams, new_player_stats):
+	global _worker_args
+	_worker_args = (data, teams, new_player_stats)
+
+def _season_games_worker(year):
+	return season_games(year, *_worker_args)
+
+def worker_bytes(data):
+	'''
+	Estimated memory of a worker process of update_store: its own copy of
+	'data' (pickled, then unpickled) on top of a forked interpreter. Events
+	are read one game at a time, so they take next to nothing.
+	'''
+	return resources.WORKER_BYTES + 2 * int(data.memory_usage(deep=True).sum())
+
+def update_store(data, teams, new_player_stats, n_jobs=1, memory=None):
+	'''
+	Recompute the partitions of the seasons whose inputs changed since they
+	were last stored. Returns the list of recomputed seasons.
+	With n_jobs > 1, each season is computed in its own worker process; the
+	partitions are still written in the order of 'years'. With a 'memory'
+	budget, fewer workers are used if 'n_jobs' of them would not fit.
+	'''
+	if not os.path.isdir(store):
+		os.makedirs(store)
+	manifest = feature_store.load_manifest(store)
+	# Players files are inputs of two seasons; hash every file once
+	file_hashes = {}
+	for year in years:
+		for name in season_inputs(year):
+			if name not in file_hashes:
+				file_hashes[name] = feature_store.file_hash(name)
+	keys = {}
+	for year in years:
+		key = season_key(year, data, teams, new_player_stats, file_hashes)
+		if feature_store.is_stale(store, manifest, year, key):
+			keys[year] = key
+		else:
+			print('Season %d is up to date.' % year)
+	updated = [year for year in years if year in keys]
+
+	if n_jobs > 1 and memory is not None:
+		n_jobs = resources.plan_workers(memory, worker_bytes(data), n_jobs)
+		print('Using %d worker processes for a memory budget of %s.'
+			% (n_jobs, resources.format_size(resources.parse_size(memory))))
+	# The workers are started and joined within the measure, so that their
+	# time and peak RSS are reported
+	with resources.measure('pre_game seasons', memory) as usage:
+		if n_jobs > 1 and len(updated) > 1:
+			pool = Pool(min(n_jobs, len(updated)), initializer=_init_worker,
+						initargs=(data, teams, new_player_stats))
+			results = pool.imap(_season_games_worker, updated)
+		else:
+			pool = None
+			results = (season_games(year, data, teams, new_player_stats) for year in updated)
+		try:
+			for year, rows in zip(updated, results):
+				feature_store.write_partition(store, year, partition_features, rows)
+				manifest[str(year)] = keys[year]
+				feature_store.save_manifest(store, manifest)
+				usage.rows += len(rows)
+		finally:
+			if pool is not None:
+				pool.close()
+				pool.join()
+	return updated
+
+def combine_store(outpath=path+'pre_game_teams.csv'):
+	'''
+	Combine the stored seasons into the training table.
+	sample_ID runs over all seasons, and the team order alternates with it:
+	even samples are written winner first (win = 1), odd samples loser first
+	(win = 0).
+	Returns the number of samples.
+	'''
+	n_stats = len(stats_features)
 	sample_ID = 0
-	past_player_names = []
-	[data, teams] = get_data()
-	new_players_data = new_players_data_gen(data)
-	new_player_stats = new_players_data.iloc[:,2:-1].mean().tolist()
-	if not os.path.isfile(path+'pre_game_teams.csv'):
-		with open(path+'pre_game_teams.csv', 'w') as outcsv:
-			writer = csv.writer(outcsv)
-			writer.writerow(output_features)
-			for year in years:
-				print('Training games in %d... The input data are taken from players stats in %d.' % (year, year - 1))
-
-				players_last_year = pd.read_csv(path+'Players_'+str(year-1)+'.csv', sep=',') #打开上一年的player的信息
-				players_this_year = pd.read_csv(path+'Players_'+str(year)+'.csv', sep=',') #打开今年player的信息
-				this_year_player_IDs = players_this_year['PlayerID'].tolist() #每个ele的type是int
-				this_year_player_names = players_this_year['PlayerName'].tolist()
-				last_year_player_IDs = players_last_year['PlayerID'].tolist() #每个ele的type是int
-				last_year_player_names = players_last_year['PlayerName'].tolist()
-
-				past_player_names = past_player_names + list(set(last_year_player_names)-set(past_player_names))
-
-				#Calculating team members in each game in this year
-				events = list(csv.reader(open(path+'Events_' + str(year) + '.csv', 'r')))
-				prev_row = events[1]
-				partition_index = []
-				for i in range(1,len(events)):
-					cur_row = events[i]
-					if cur_row[3] != prev_row[3] or cur_row[4] != prev_row[4]:
-						prev_row = cur_row
-						partition_index.append(i-1)
-				print('There are', len(partition_index), 'games in year', year)
-				partition_index.insert(0, 0)
-
-				for j in range(len(partition_index) - 1):
-					game_j = events[partition_index[j] + 1 : partition_index[j + 1] + 1] #a subset of events corresponding to one game
-					W_ID = game_j[0][3]
-					L_ID = game_j[0][4]
-					W_players_ID = [] #each ele type should be int
-					L_players_ID = []
-					for k in range(len(game_j)):
-						if game_j[k][-3] == W_ID and int(game_j[k][-2]) not in teams and int(game_j[k][-2]) not in W_players_ID:
-								W_players_ID.append(int(game_j[k][-2]))
-						elif game_j[k][-3] == L_ID and int(game_j[k][-2]) not in teams and int(game_j[k][-2]) not in L_players_ID:
-							L_players_ID.append(int(game_j[k][-2]))
-
-					#Calculating WTeam stats
-					W_player_stats = player_stats_gen(W_players_ID, this_year_player_names, this_year_player_IDs, last_year_player_names, last_year_player_IDs, data, new_player_stats)
-					W_team_stats = team_stats_gen(W_player_stats)
-
-					#Calculating LTeam stats
-					L_player_stats = player_stats_gen(L_players_ID, this_year_player_names, this_year_player_IDs, last_year_player_names, last_year_player_IDs, data, new_player_stats)
-					L_team_stats = team_stats_gen(L_player_stats)
-
-					#Writing to features.csv
-					if sample_ID % 2 == 0:
-						row = [sample_ID] + list(W_team_stats) + list(L_team_stats) + [1]
-					else:
-						row = [sample_ID] + list(L_team_stats) + list(W_team_stats) + [0]
-					writer.writerow(row)
-					sample_ID += 1
-
-main()
+	with open(outpath, 'w') as outcsv:
+		writer = csv.writer(outcsv)
+		writer.writerow(output_features)
+		for year in years:
+			for game in feature_store.read_partition(store, year):
+				W_team_stats = game[1:1 + n_stats]
+				L_team_stats = game[1 + n_stats:]
+				if sample_ID % 2 == 0:
+					row = [sample_ID] + W_team_stats + L_team_stats + [1]
+				else:
+					row = [sample_ID] + L_team_stats + W_team_stats + [0]
+				writer.writerow(row)
+				sample_ID += 1
+	return sample_ID
+
+def main(n_jobs=1, memory=None):
+	'''
+	'memory' is a budget such as '4G' that limits the number of worker
+	processes; every stage reports its peak RSS and rows per second.
+	'''
+	with resources.measure('pre_game data', memory) as usage:
+		[data, teams] = get_data()
+		new_players_data = new_players_data_gen(data)
+		new_player_stats = new_players_data.iloc[:,2:-1].mean().tolist()
+		usage.rows = data.shape[0]
+	update_store(data, teams, new_player_stats, n_jobs, memory)
+	with resources.measure('pre_game combine', memory) as usage:
+		usage.rows = combine_store()
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Generate pre_game_teams.csv')
+	parser.add_argument('-j', '--jobs', type=int, default=1,
+						help='number of seasons computed in parallel')
+	parser.add_argument('--memory', default=None,
+						help='memory budget, e.g. 4G; may lower the number of jobs')
+	args = parser.parse_args()
+	main(args.jobs, args.memory)
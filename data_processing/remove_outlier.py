@@ -1,21 +1,128 @@
+'''
+Detect outliers of post_game_team_diff.csv with an isolation forest and
+write the remaining rows to post_game_team_diff_removed_outlier.csv
+
+The forest can be fitted on a uniform sample of the rows and saved, and the
+file is scored in chunks, so the whole table never has to be in memory.
+
+Usage:
+	python3 data_processing/remove_outlier.py [--root ./data_processing/output/] [--sample N] [--jobs N] [--model forest.pkl]
+'''
+import os
+import argparse
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 import numpy as np
+try:
+	import joblib
+except ImportError:
+	from sklearn.externals import joblib
 
-def remove_outlier(root):
-	filepath = root + 'post_game_team_diff.csv'
+root = './data_processing/output/'
+label = 'W/L'
+
+def read_chunks(filepath, chunksize):
+	'''
+	Read a diff table chunk by chunk; the first (unnamed) column is the index
+	'''
 	try:
-		df = pd.read_csv(filepath)
-	except:
+		return pd.read_csv(filepath, index_col=0, chunksize=chunksize)
+	except IOError:
 		print("can't open the file")
 		exit(0)
-	rng = np.random.RandomState(42)
-	clf = IsolationForest(behaviour='new', max_samples=100,
-	                      random_state=rng, contamination='auto')
-	dectec = clf.fit_predict(df)
-	outlier = np.where(dectec==-1)[0]
-	dropped_csv = df.drop(outlier,axis=0)
-	dropped_csv.to_csv(root + 'post_game_team_diff_removed_outlier.csv')
 
+def features(df):
+	'''
+	Columns the forest is fitted on: the diff columns, without the W/L label
+	'''
+	return df.drop(label, axis=1, errors='ignore').values
+
+def sample_rows(filepath, n_sample, chunksize=100000, seed=42):
+	'''
+	Draw 'n_sample' rows uniformly from 'filepath' in one pass over the file.
+	Every row gets a random key and the rows with the smallest keys are kept,
+	so at most 'n_sample' + 'chunksize' rows are in memory at once.
+	If 'n_sample' is None, all rows are returned.
+	'''
+	rng = np.random.RandomState(seed)
+	sample = None
+	keys = np.empty(0)
+	for chunk in read_chunks(filepath, chunksize):
+		if n_sample is None:
+			sample = chunk if sample is None else pd.concat([sample, chunk])
+			continue
+		chunk_keys = rng.random_sample(chunk.shape[0])
+		sample = chunk if sample is None else pd.concat([sample, chunk])
+		keys = np.concatenate([keys, chunk_keys])
+		if keys.shape[0] > n_sample:
+			keep = np.argpartition(keys, n_sample)[:n_sample]
+			keep.sort()
+			sample = sample.iloc[keep]
+			keys = keys[keep]
+	return sample
+
+def new_forest(seed=42, n_jobs=1):
+	kwargs = dict(max_samples=100, random_state=np.random.RandomState(seed),
+				  contamination='auto', n_jobs=n_jobs)
+	try:
+		return IsolationForest(behaviour='new', **kwargs)
+	except TypeError:
+		# 'behaviour' was removed in scikit-learn 0.24, where 'new' is the only one
+		return IsolationForest(**kwargs)
+
+def fit_forest(filepath, n_sample=None, n_jobs=1, chunksize=100000, seed=42, model_path=None):
+	'''
+	Fit an isolation forest on (a sample of) the rows of 'filepath' and save
+	it to 'model_path' if given
+	'''
+	df = sample_rows(filepath, n_sample, chunksize, seed)
+	clf = new_forest(seed, n_jobs)
+	clf.fit(features(df))
+	if model_path is not None:
+		joblib.dump(clf, model_path)
+	return clf
+
+def score_file(clf, filepath, outpath, chunksize=100000):
+	'''
+	Predict every row of 'filepath' chunk by chunk with a fitted forest and
+	append the inliers to 'outpath'.
+	Returns the number of rows and the number of outliers.
+	'''
+	n_rows = 0
+	n_outliers = 0
+	header = True
+	for chunk in read_chunks(filepath, chunksize):
+		dectec = clf.predict(features(chunk))
+		n_rows += chunk.shape[0]
+		n_outliers += int((dectec == -1).sum())
+		chunk[dectec != -1].to_csv(outpath, mode='w' if header else 'a', header=header)
+		header = False
+	return n_rows, n_outliers
+
+def remove_outlier(root=root, n_sample=None, n_jobs=1, chunksize=100000, model_path=None, refit=False):
+	'''
+	Remove the outliers of root + 'post_game_team_diff.csv'.
+	A forest saved at 'model_path' is reused unless 'refit' is set, so new
+	diff files can be filtered without fitting again.
+	'''
+	filepath = root + 'post_game_team_diff.csv'
+	if model_path is not None and os.path.isfile(model_path) and not refit:
+		clf = joblib.load(model_path)
+	else:
+		clf = fit_forest(filepath, n_sample, n_jobs, chunksize, model_path=model_path)
+	n_rows, n_outliers = score_file(clf, filepath, root + 'post_game_team_diff_removed_outlier.csv', chunksize)
+	print('Removed', n_outliers, 'outliers out of', n_rows, 'rows.')
+
+def main():
+	parser = argparse.ArgumentParser(description='Remove outliers of post_game_team_diff.csv')
+	parser.add_argument('--root', default=root, help='directory of post_game_team_diff.csv')
+	parser.add_argument('--sample', type=int, default=None, help='number of rows to fit the forest on (default: all)')
+	parser.add_argument('-j', '--jobs', type=int, default=1, help='number of jobs to fit and score the forest')
+	parser.add_argument('--chunksize', type=int, default=100000, help='number of rows scored at once')
+	parser.add_argument('--model', default=None, help='path to save/load the fitted forest')
+	parser.add_argument('--refit', action='store_true', help='fit a new forest even if --model exists')
+	args = parser.parse_args()
+	remove_outlier(args.root, args.sample, args.jobs, args.chunksize, args.model, args.refit)
 
-remove_outlier('/Users/jixingwei/Desktop/ECS-171-Group-Project/data_processing/output/')
\ No newline at end of file
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,153 @@
+'''
+Memory budget and resource usage of the feature generation stages.
+
+A budget such as '4G' is turned into a chunk size (how many bytes of a csv
+file are parsed at once) and a number of worker processes, and every stage
+reports its time, rows per second and peak RSS, e.g.
+
+	[frame] 12345678 rows in 310.2s (39800 rows/s), peak RSS 1.2G, children 0B
+
+Peak RSS is the high-water mark of this process since the stage started
+(reset through /proc/self/clear_refs on Linux; since the start of the
+process elsewhere). The children peak is that of the largest child process
+that exited during the stage; as the system only keeps the largest of all
+the children of the process, it is 0 if that one exited before the stage.
+'''
+
+import sys
+import time
+import resource
+from contextlib import contextmanager
+
+# Memory taken by a csv file once parsed into lists of strings, per byte of
+# the file (about 13x for the Events files, plus the raw and decoded text)
+ROW_FACTOR = 16
+
+# Memory of a forked worker process of its own, before it loads anything
+WORKER_BYTES = 64 << 20
+
+UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+def parse_size(size):
+	'''
+	Number of bytes of a size such as 4096, '512M' or '4G'
+	'''
+	if size is None or isinstance(size, (int, float)):
+		return size
+	size = size.strip().upper().rstrip('B')
+	unit = size[-1:] if size[-1:] in UNITS else ''
+	return int(float(size[:len(size) - len(unit)]) * UNITS[unit])
+
+def format_size(n_bytes):
+	for unit in ['B', 'K', 'M', 'G']:
+		if n_bytes < 1024:
+			return '%dB' % n_bytes if unit == 'B' else '%.1f%s' % (n_bytes, unit)
+		n_bytes /= 1024.0
+	return '%.1fT' % n_bytes
+
+def _maxrss(who):
+	# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+	rss = resource.getrusage(who).ru_maxrss
+	return rss if sys.platform == 'darwin' else rss * 1024
+
+def _status(field):
+	try:
+		with open('/proc/self/status') as f:
+			for line in f:
+				if line.startswith(field + ':'):
+					return int(line.split()[1]) * 1024
+	except IOError:
+		pass
+	return None
+
+def current_rss():
+	rss = _status('VmRSS')
+	return rss if rss is not None else _maxrss(resource.RUSAGE_SELF)
+
+def reset_peak():
+	'''
+	Reset the peak RSS of this process to its current RSS, where supported
+	'''
+	try:
+		with open('/proc/self/clear_refs', 'w') as f:
+			f.write('5')
+	except (IOError, OSError):
+		pass
+
+def peak_rss():
+	peak = _status('VmHWM')
+	return peak if peak is not None else _maxrss(resource.RUSAGE_SELF)
+
+def children_peak_rss():
+	return _maxrss(resource.RUSAGE_CHILDREN)
+
+def chunk_bytes(budget, n_workers=1, factor=ROW_FACTOR, minimum=1 << 20):
+	'''
+	Number of bytes of a csv file each of 'n_workers' processes can parse at
+	once within 'budget' bytes on top of what this process already uses.
+	Returns None (no limit) if 'budget' is None.
+	'''
+	budget = parse_size(budget)
+	if budget is None:
+		return None
+	free = budget - current_rss()
+	return max(minimum, int(free / n_workers / factor))
+
+def plan_workers(budget, worker_bytes, max_workers):
+	'''
+	Number of worker processes, at most 'max_workers', that each use
+	'worker_bytes' and fit within 'budget' bytes on top of what this process
+	already uses. At least 1 (with a warning if even that does not fit).
+	'''
+	budget = parse_size(budget)
+	if budget is None:
+		return max_workers
+	n_workers = int((budget - current_rss()) // max(worker_bytes, 1))
+	if n_workers < 1:
+		print('Warning: a worker needs about %s, over the memory budget of %s.'
+			% (format_size(worker_bytes), format_size(budget)))
+	return max(1, min(max_workers, n_workers))
+
+class Usage(object):
+	'''
+	Resources used by a stage; 'rows' is set by the stage
+	'''
+	def __init__(self, name, budget=None):
+		self.name = name
+		self.budget = parse_size(budget)
+		self.rows = 0
+		self.seconds = 0.0
+		self.peak = 0
+		self.children_peak = 0
+
+	def rows_per_second(self):
+		return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+	def __str__(self):
+		return '[%s] %d rows in %.1fs (%.0f rows/s), peak RSS %s, children %s' % (
+			self.name, self.rows, self.seconds, self.rows_per_second(),
+			format_size(self.peak), format_size(self.children_peak))
+
+@contextmanager
+def measure(name, budget=None):
+	'''
+	Time a stage and record its peak RSS; the stage sets the 'rows' of the
+	yielded Usage. The usage is printed at the end of the stage, with a
+	warning if it went over 'budget'.
+	'''
+	usage = Usage(name, budget)
+	reset_peak()
+	children_before = children_peak_rss()
+	start = time.time()
+	try:
+		yield usage
+	finally:
+		usage.seconds = time.time() - start
+		usage.peak = peak_rss()
+		# Only reported if a child of this stage went over the earlier ones
+		children_peak = children_peak_rss()
+		usage.children_peak = children_peak if children_peak > children_before else 0
+		print(usage)
+		if usage.budget is not None and max(usage.peak, usage.children_peak) > usage.budget:
+			print('Warning: [%s] went over the memory budget of %s.'
+				% (name, format_size(usage.budget)))
@@ -1,23 +1,105 @@
+'''
+Embed the post-game diff table in 2D with t-SNE and plot it.
+
+The embedding is cached under root + 'tsne_cache/', keyed by the hash of the
+input file and the parameters, so re-drawing the plot does not recompute it.
+
+Usage:
+	python3 data_processing/tsne_graph_gen.py [--root ./data_processing/output/] [--sample N] [--pca N] [--angle 0.5] [--jobs N]
+'''
+import os
+import argparse
 from sklearn.manifold import TSNE
+from sklearn.decomposition import PCA
 import pandas as pd
 import numpy as np
 import plotnine as p9
 
-def drawTSNE(root):
+import feature_store
+
+root = './data_processing/output/'
+label = 'W/L'
+
+def stratified_sample(df, n_sample, seed=0):
+	'''
+	Draw about 'n_sample' rows keeping the proportion of each label
+	'''
+	if n_sample is None or n_sample >= df.shape[0]:
+		return df
+	frac = float(n_sample) / df.shape[0]
+	return pd.concat([group.sample(frac=frac, random_state=seed)
+					  for _, group in df.groupby(label)]).sort_index()
+
+def embed(df, n_pca=None, angle=0.5, n_jobs=None, seed=0):
+	'''
+	Run Barnes-Hut t-SNE on the feature columns of 'df', after an optional
+	PCA reduction to 'n_pca' components
+	'''
+	X = df.drop(label, axis=1).values
+	if n_pca is not None and n_pca < X.shape[1]:
+		X = PCA(n_components=n_pca, random_state=seed).fit_transform(X)
+	kwargs = dict(n_components=2, method='barnes_hut', angle=angle, random_state=seed)
+	if n_jobs is not None:
+		kwargs['n_jobs'] = n_jobs
+	return TSNE(**kwargs).fit_transform(X)
+
+def tsne_embedding(root=root, n_sample=None, n_pca=None, angle=0.5, n_jobs=None, seed=0):
+	'''
+	Return a dataframe with the columns x, y and the label of each embedded
+	row, computing it only if it is not cached yet
+	'''
 	filepath = root + 'post_game_team_diff.csv'
 	try:
-		df = pd.read_csv(filepath)
-	except:
+		key = feature_store.value_hash([feature_store.file_hash(filepath), n_sample, n_pca, angle, seed])
+	except IOError:
 		print("can't open the file")
 		exit(0)
-	X_embedded = TSNE(n_components=2).fit_transform(df)
-	df_tsne = pd.DataFrame()
+	cache_dir = root + 'tsne_cache/'
+	cache_path = cache_dir + key + '.csv'
+	if os.path.isfile(cache_path):
+		return pd.read_csv(cache_path, index_col=0)
+
+	df = pd.read_csv(filepath, index_col=0)
+	df = stratified_sample(df, n_sample, seed)
+	X_embedded = embed(df, n_pca, angle, n_jobs, seed)
+	df_tsne = pd.DataFrame(index=df.index)
 	df_tsne['x'] = X_embedded[:,0]
 	df_tsne['y'] = X_embedded[:,1]
+	df_tsne[label] = df[label]
+
+	if not os.path.isdir(cache_dir):
+		os.makedirs(cache_dir)
+	df_tsne.to_csv(cache_path)
+	return df_tsne
 
-	p9.ggplot(df_tsne) \
-	+p9.aes('x','y') \
-	+p9.geom_point(color='blue',size=0.01) \
+def drawTSNE(root=root, n_sample=None, n_pca=None, angle=0.5, n_jobs=None, seed=0, outpath=None):
+	'''
+	Plot the t-SNE embedding and save it to 'outpath' (root + 'tsne.png' by
+	default)
+	'''
+	df_tsne = tsne_embedding(root, n_sample, n_pca, angle, n_jobs, seed)
+	df_tsne[label] = df_tsne[label].astype(str)
+
+	plot = p9.ggplot(df_tsne) \
+	+p9.aes('x','y',color=label) \
+	+p9.geom_point(size=0.01) \
 	+p9.labels.ggtitle('high dimensional data visualization by t-SNE')
+	if outpath is None:
+		outpath = root + 'tsne.png'
+	plot.save(outpath, verbose=False)
+	return plot
+
+def main():
+	parser = argparse.ArgumentParser(description='Plot post_game_team_diff.csv with t-SNE')
+	parser.add_argument('--root', default=root, help='directory of post_game_team_diff.csv')
+	parser.add_argument('--sample', type=int, default=None, help='number of rows, sampled per W/L class (default: all)')
+	parser.add_argument('--pca', type=int, default=None, help='number of PCA components to reduce to before t-SNE')
+	parser.add_argument('--angle', type=float, default=0.5, help='Barnes-Hut angle')
+	parser.add_argument('-j', '--jobs', type=int, default=None, help='number of threads for t-SNE')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('-o', '--output', default=None, help='path of the plot (default: root/tsne.png)')
+	args = parser.parse_args()
+	drawTSNE(args.root, args.sample, args.pca, args.angle, args.jobs, args.seed, args.output)
 
-drawTSNE('/Users/jixingwei/Desktop/ECS-171-Group-Project/data_processing/output/')
\ No newline at end of file
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,117 @@
+import math
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+
+
+# Round reached by the winners of each round of a 64-team bracket
+round_names = ['R32', 'S16', 'E8', 'F4', 'Final', 'Champion']
+
+# Win-probability matrix shared by the worker processes
+_P = None
+
+
+def _init_worker(P):
+    global _P
+    _P = P
+
+
+def simulate_batch(P, n_sims, seed):
+    """ Simulate 'n_sims' tournaments, one round for all of them at a time
+
+    Input:
+      - @P: np.array
+           n_team x n_team matrix; P[i, j] is the probability that team i
+             beats team j. Teams are in bracket order: 0 plays 1, 2 plays 3,
+             the winners of (0, 1) and (2, 3) meet, etc.
+      - @n_sims: int
+           Number of tournaments.
+      - @seed: int
+           Seed of the RNG of this batch.
+    Returns:
+      - n_round x n_team np.array; entry [r, i] is the number of
+          tournaments in which team i won its game of round r
+    """
+    n_team = P.shape[0]
+    n_round = int(math.log(n_team, 2))
+    rng = np.random.RandomState(seed)
+    dtype = np.uint8 if n_team <= 256 else np.int32
+
+    slots = np.tile(np.arange(n_team, dtype=dtype), (n_sims, 1))
+    counts = np.zeros((n_round, n_team), dtype=np.int64)
+    for r in range(n_round):
+        a = slots[:, 0::2]
+        b = slots[:, 1::2]
+        a_wins = rng.random_sample(a.shape) < P[a, b]
+        slots = np.where(a_wins, a, b)
+        counts[r] = np.bincount(slots.ravel(), minlength=n_team)
+    return counts
+
+
+def _simulate_batch_worker(args):
+    return simulate_batch(_P, *args)
+
+
+def simulate(P, field=None, teams=None, n_sims=1000000, seed=1234,
+             n_jobs=1, batch_size=100000):
+    """ Monte Carlo simulation of a single elimination tournament
+
+        The simulations are split into batches of 'batch_size' with their own
+          seeds drawn from 'seed', so the result does not depend on 'n_jobs'.
+
+    Input:
+      - @P: np.array
+           Win-probability matrix, e.g. from mlp.matchup.matchup_matrix().
+      - @field: list of int, default None
+           Rows of 'P' of the teams in the tournament, in bracket order
+             (see simulate_batch()). Its length must be a power of 2, e.g.
+             64. If None, every row of 'P' is in the field.
+      - @teams: list, default None
+           Labels of the teams of 'field', e.g. team IDs. Defaults to 'field'.
+      - @n_sims: int, default 1000000
+           Number of tournaments to simulate.
+      - @seed: int, default 1234
+           Seed for RNGs to provide reproducibility.
+      - @n_jobs: int, default 1
+           Number of processes.
+      - @batch_size: int, default 100000
+           Number of tournaments simulated at once by a process.
+    Returns:
+      - pd.DataFrame with one row per team and one column per round; each
+          entry is the probability of the team reaching that round
+    """
+    P = np.asarray(P, dtype=np.float64)
+    if field is None:
+        field = list(range(P.shape[0]))
+    if teams is None:
+        teams = list(field)
+    n_team = len(field)
+    if n_team < 2 or n_team & (n_team - 1):
+        raise ValueError('The number of teams must be a power of 2.')
+    P = P[np.ix_(field, field)]
+
+    sizes = [batch_size] * (n_sims // batch_size)
+    if n_sims % batch_size:
+        sizes.append(n_sims % batch_size)
+    seeds = np.random.RandomState(seed).randint(2**31 - 1, size=len(sizes))
+    batches = list(zip(sizes, seeds))
+
+    if n_jobs > 1 and len(batches) > 1:
+        pool = Pool(min(n_jobs, len(batches)), initializer=_init_worker,
+                    initargs=(P,))
+        try:
+            results = pool.map(_simulate_batch_worker, batches)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [simulate_batch(P, size, s) for size, s in batches]
+    counts = np.sum(results, axis=0)
+
+    n_round = counts.shape[0]
+    if n_round == len(round_names):
+        columns = round_names
+    else:
+        columns = ['round_' + str(r + 1) for r in range(n_round)]
+    return pd.DataFrame(counts.T / float(n_sims), index=teams,
+                        columns=columns)
@@ -0,0 +1,181 @@
+import os
+import numpy as np
+import pandas as pd
+from mlp.sweep_index import find_runs
+
+
+def sweep_results(model_name, datapoints_dir='./mlp/datapoints/',
+                  checkpoints_dir='./mlp/checkpoints/', index=None):
+    """ Best saved epoch of every run of a grid search
+
+        Runs are found from '[model name]_[# of hidden layers]_[# of
+          neurons]_[compact/detailed].csv' under 'datapoints_dir'. For each
+          run, the epoch with the highest testing accuracy among those that
+          have a checkpoint in 'checkpoints_dir' is kept.
+
+    Input:
+      - @model_name: str
+           Name of the model given to Mlp.
+      - @datapoints_dir: str, default './mlp/datapoints/'
+      - @checkpoints_dir: str, default './mlp/checkpoints/'
+      - @index: mlp.sweep_index.SweepIndex, default None
+           If given, the runs are looked up in the index instead of the
+             files.
+    Returns:
+      - pd.DataFrame with columns n_hidden, n_node, epoch, training_acc,
+          testing_acc and checkpoint (path prefix to restore), sorted by
+          decreasing testing accuracy
+    """
+    if index is not None:
+        return index.best(model_name)
+    rows = []
+    for (n_hidden, n_node), files in find_runs(model_name,
+                                               datapoints_dir).items():
+        prefix = os.path.join(checkpoints_dir, '_'.join([model_name,
+                                                         str(n_hidden),
+                                                         str(n_node)]))
+        df = pd.concat([pd.read_csv(filepath, header=0, sep=',',
+                                    index_col=None,
+                                    usecols=['epoch', 'training_acc',
+                                             'testing_acc'])
+                        for filepath in files], ignore_index=True)
+        df = df[[os.path.isfile(prefix + '-' + str(epoch) + '.index')
+                 for epoch in df['epoch']]]
+        if df.shape[0] == 0:
+            continue
+        best = df.loc[df['testing_acc'].idxmax()]
+        rows.append([n_hidden, n_node, int(best['epoch']),
+                     best['training_acc'], best['testing_acc'],
+                     prefix + '-' + str(int(best['epoch']))])
+    results = pd.DataFrame(rows, columns=['n_hidden', 'n_node', 'epoch',
+                                          'training_acc', 'testing_acc',
+                                          'checkpoint'])
+    return (results.sort_values('testing_acc', ascending=False)
+                   .reset_index(drop=True))
+
+
+def load_weights(checkpoint, n_hidden):
+    """ Read the weights and biases of a checkpoint without building a graph
+
+    Input:
+      - @checkpoint: str
+           Path prefix of the checkpoint, e.g.
+             './mlp/checkpoints/NCAA_1_5-100'.
+      - @n_hidden: int
+           Number of hidden layers.
+    Returns:
+      - List of (W, b) np.arrays, one per layer, output layer last
+    """
+    import tensorflow as tf
+
+    reader = tf.train.NewCheckpointReader(checkpoint)
+    names = [str(i + 1) for i in range(n_hidden)] + ['out']
+    return [(reader.get_tensor('W' + name), reader.get_tensor('b' + name))
+            for name in names]
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class Ensemble(object):
+    def __init__(self, members, weights=None):
+        """ Ensemble of trained MLPs evaluated with numpy
+
+        Members with the same topology are stacked, so that each layer of a
+          group is a single batched matrix product for all its members.
+
+        Input:
+          - @members: list of list of (W, b)
+               Layers of every member, as returned by load_weights().
+          - @weights: list of float, default None
+               Weight of each member when combining; equal if None.
+        """
+        if weights is None:
+            weights = np.ones(len(members))
+        weights = np.asarray(weights, dtype=np.float64)
+        self.weights = weights / weights.sum()
+
+        groups = {}
+        for i, layers in enumerate(members):
+            shape = tuple(W.shape for W, _ in layers)
+            groups.setdefault(shape, []).append(i)
+        # For each topology: member indices and stacked (W, b) per layer
+        self.groups = []
+        for idx in groups.values():
+            n_layer = len(members[idx[0]])
+            stacked = [(np.stack([members[i][l][0] for i in idx]),
+                        np.stack([members[i][l][1] for i in idx]))
+                       for l in range(n_layer)]
+            self.groups.append((idx, stacked))
+
+    @classmethod
+    def from_sweep(cls, model_name, k=5, weighting='equal',
+                   datapoints_dir='./mlp/datapoints/',
+                   checkpoints_dir='./mlp/checkpoints/', index=None):
+        """ Ensemble of the 'k' runs with the best testing accuracy
+
+        Input:
+          - @model_name: str
+               Name of the model given to Mlp.
+          - @k: int, default 5
+               Number of members.
+          - @weighting: str, default 'equal'
+               'equal' or 'accuracy' to weight the members by their testing
+                 accuracy.
+          - @index: mlp.sweep_index.SweepIndex, default None
+               See sweep_results().
+        """
+        best = sweep_results(model_name, datapoints_dir,
+                             checkpoints_dir, index).head(k)
+        members = [load_weights(row.checkpoint, row.n_hidden)
+                   for row in best.itertuples()]
+        weights = (best['testing_acc'].values if weighting == 'accuracy'
+                   else None)
+        ensemble = cls(members, weights)
+        ensemble.results = best
+        return ensemble
+
+    def member_proba(self, X):
+        """ Output of every member for every row of 'X'
+        Input:
+          - @X: np.array
+               N x n_feat matrix normalized as for training.
+        Returns:
+          - K x N np.array
+        """
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty((len(self.weights), X.shape[0]), dtype=np.float32)
+        for idx, stacked in self.groups:
+            h = X[None, :, :]
+            for W, b in stacked:
+                # (K, N, n_in) x (K, n_in, n_out) + (K, 1, n_out)
+                h = _sigmoid(np.matmul(h, W) + b)
+            out[idx] = h[:, :, 0]
+        return out
+
+    def predict_proba(self, X, method='mean', batch_size=1 << 16):
+        """ Combined probability of the output being 1
+
+        Input:
+          - @X: np.array
+               N x n_feat matrix normalized as for training.
+          - @method: str, default 'mean'
+               'mean' for the weighted mean of the probabilities, or 'vote'
+                 for the weighted fraction of members predicting 1.
+          - @batch_size: int, default 65536
+               Number of rows evaluated at once.
+        Returns:
+          - np.array of N probabilities
+        """
+        proba = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], batch_size):
+            P = self.member_proba(X[start:start + batch_size])
+            if method == 'vote':
+                P = (P >= 0.5)
+            proba[start:start + batch_size] = self.weights.dot(P)
+        return proba
+
+    def predict(self, X, method='mean'):
+        """ Combined 0/1 prediction """
+        return (self.predict_proba(X, method) >= 0.5).astype(np.float32)
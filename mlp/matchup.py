@@ -0,0 +1,91 @@
+import hashlib
+import weakref
+import numpy as np
+
+
+# Matrices already computed, per model: {model: {key: matrix}}
+_cache = weakref.WeakKeyDictionary()
+
+
+def pair_features(team_stats):
+    """ Build the feature rows of every (a, b) pair of teams
+
+        Row i * N + j holds the stats of team i followed by those of team j,
+          the same a/b layout as '/NCAA_data/pre_game_teams.csv'.
+
+    Input:
+      - @team_stats: np.array
+           N x F matrix with one row of team stats per team, e.g. as
+             returned by 'team_stats_gen' in pre_game_teams_gen.py.
+    Returns:
+      - N*N x 2F matrix
+    """
+    team_stats = np.asarray(team_stats)
+    n_team = team_stats.shape[0]
+    return np.hstack([np.repeat(team_stats, n_team, axis=0),
+                      np.tile(team_stats, (n_team, 1))])
+
+
+def matchup_matrix(model, team_stats, batch_size=1 << 16, normalize=True,
+                   use_cache=True):
+    """ Probability of each team beating each other team
+
+        All N*N pairs are scored with batched forward passes. As the model
+          sees (a, b) and (b, a) as different inputs, both orientations are
+          averaged so that P[i, j] + P[j, i] == 1, and P[i, i] is 0.5.
+
+        Results are cached per model and per 'team_stats'; call
+          clear_cache() after training the model further.
+
+    Input:
+      - @model: Mlp
+           A trained model (after new_model() or continue_model()) with
+             'n_feat' == 2 * F.
+      - @team_stats: np.array
+           N x F matrix of raw team stats, one row per team.
+      - @batch_size: int, default 65536
+           Number of pairs fed to the model at once.
+      - @normalize: boolean, default True
+           Flag for whether to normalize the features with
+             'model.normalize()'. Set to False if 'team_stats' are already
+             normalized.
+      - @use_cache: boolean, default True
+           Flag for whether to return/store a cached matrix.
+    Returns:
+      - N x N np.array; entry [i, j] is the probability that team i beats
+          team j
+    """
+    team_stats = np.ascontiguousarray(team_stats, dtype=np.float64)
+    key = (hashlib.sha1(team_stats.tobytes()).hexdigest(), team_stats.shape,
+           normalize)
+    if use_cache:
+        cached = _cache.setdefault(model, {})
+        if key in cached:
+            return cached[key]
+
+    n_team = team_stats.shape[0]
+    X = pair_features(team_stats)
+    if normalize:
+        X = model.normalize(X)
+    X = X.astype(np.float32)
+
+    p = np.empty(X.shape[0], dtype=np.float64)
+    for start in range(0, X.shape[0], batch_size):
+        stop = start + batch_size
+        p[start:stop] = model.predict_proba(X[start:stop]).ravel()
+    p = p.reshape(n_team, n_team)
+
+    P = (p + 1.0 - p.T) / 2.0
+    np.fill_diagonal(P, 0.5)
+
+    if use_cache:
+        cached[key] = P
+    return P
+
+
+def clear_cache(model=None):
+    """ Drop the cached matrices of 'model', or of every model if None """
+    if model is None:
+        _cache.clear()
+    else:
+        _cache.pop(model, None)
@@ -4,6 +4,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import tensorflow as tf
 import csv
+import os
 from os import system
 
 
@@ -206,7 +207,8 @@ class Mlp(object):
                  pathToDataset='feature.csv', init_b=1.0, r_l=0.1,
                  random=False, intvl_save=100, intvl_write=10, intvl_print=10,
                  compact_plot=True, seed = 1234, max_to_keep=None,
-                 normalization='nor'):
+                 normalization='nor', n_threads=None, n_inter_threads=None,
+                 cpus=None, sweep_index=None):
         """ Initialization of MLP attributes
         Input:
           - @model_name: str
@@ -251,6 +253,20 @@ class Mlp(object):
           - @normalization: str
                Normalization method. Default is (X - min(X))/(max(X) - min(X))
                  unless 'zscore' is specified.
+          - @n_threads: int, default None
+               Number of threads of the Tensorflow session used within an
+                 operation. If None, Tensorflow uses every core.
+          - @n_inter_threads: int, default None
+               Number of Tensorflow operations run at the same time. If
+                 None, Tensorflow picks it from the number of cores.
+          - @cpus: list of int, default None
+               CPUs the process is pinned to when a session is created; not
+                 pinned if None. See mlp/scheduler.py to share the cores of
+                 a computer between several models.
+          - @sweep_index: str or mlp.sweep_index.SweepIndex, default None
+               Index (or path of the index) where the accuracy of every
+                 datapoint and the step of every checkpoint are recorded;
+                 nothing is recorded if None.
         """
         # NP settings: print 250 chars/line; no summarization; always floats
         np.set_printoptions(linewidth=250, threshold=np.nan, suppress=True)
@@ -275,34 +291,122 @@ class Mlp(object):
         self.compact_plot = compact_plot
         self.seed = seed
         self.max_to_keep = max_to_keep
-
-        if normalization is 'zscore':
-            print('Using z-score for normalization.')
-            for i in range(n_feat):
-                df.iloc[:, i] = ((df.iloc[:, i] - df.iloc[:, i].mean())
-                                     /df.iloc[:, i].std())
-        else:
-            print('Using (X - min(X))/(max(X) - min(X)) for normalization.')
-            for i in range(n_feat):
-                max = df.iloc[:,i].max()
-                min = df.iloc[:,i].min()
-                df.iloc[:, i] = ((df.iloc[:, i] - min) / (max - min))
+        self.n_threads = n_threads
+        self.n_inter_threads = n_inter_threads
+        self.cpus = cpus
+        if isinstance(sweep_index, str):
+            from mlp.sweep_index import SweepIndex
+            sweep_index = SweepIndex(sweep_index)
+        self.sweep_index = sweep_index
+        # Number of update_model() calls
+        self.n_update = 0
+        # Step of the last checkpoint saved or restored
+        self.global_step = None
 
         self.df = df
-        # Split data
-        #X = self.df.iloc[:, 0:n_feat].values
+        # Split data; X and Y are shuffled with the same permutation
         X = self.df.iloc[:, 0:n_feat]
         X = X.sample(frac=1, random_state=seed)
         X = (X.reset_index(drop=True)).values
-        self.X_train = X[0:n_train,]
-        self.X_test = X[n_train: ,]
 
-        #Y = self.df.iloc[:, n_feat:].values
         Y = self.df.iloc[:, n_feat:]
         Y = Y.sample(frac=1, random_state=seed)
         Y = (Y.reset_index(drop=True)).values
-        self.Y_train = Y[0:n_train,]
-        self.Y_test = Y[n_train:,]
+
+        # Normalization is fitted on the training rows only and kept as
+        #   (X - norm_shift) / norm_scale so that it can be applied to new
+        #   inputs with normalize() and saved with the checkpoints
+        self.normalization = normalization
+        X_fit = X[0:n_train,]
+        if normalization == 'zscore':
+            print('Using z-score for normalization.')
+            self.norm_shift = X_fit.mean(axis=0)
+            self.norm_scale = X_fit.std(axis=0, ddof=1)
+        else:
+            print('Using (X - min(X))/(max(X) - min(X)) for normalization.')
+            self.norm_shift = X_fit.min(axis=0)
+            self.norm_scale = X_fit.max(axis=0) - X_fit.min(axis=0)
+        # Constant features are only shifted
+        self.norm_scale[self.norm_scale == 0] = 1.0
+
+        # Stored once as contiguous float32, the dtype of the placeholders,
+        #   so that feeding them does not need a conversion
+        self.X_train = np.ascontiguousarray(self.normalize(X[0:n_train,]),
+                                            dtype=np.float32)
+        self.X_test = np.ascontiguousarray(self.normalize(X[n_train: ,]),
+                                           dtype=np.float32)
+        self.Y_train = np.ascontiguousarray(Y[0:n_train,], dtype=np.float32)
+        self.Y_test = np.ascontiguousarray(Y[n_train:,], dtype=np.float32)
+
+
+    def norm_path(self, checkpoint):
+        """ Path of the file with the normalization parameters saved with
+            'checkpoint', a checkpoint prefix such as
+            './mlp/checkpoints/NCAA_1_5-100' """
+        return checkpoint + '_norm.npz'
+
+
+    def save_norm(self, checkpoint):
+        """ Save the normalization parameters next to 'checkpoint' """
+        np.savez(self.norm_path(checkpoint), shift=self.norm_shift,
+                 scale=self.norm_scale, method=self.normalization)
+
+
+    def load_norm(self, checkpoint):
+        """ Use the normalization parameters saved with 'checkpoint'
+
+            The training and testing sets are normalized again if the
+              parameters differ from the current ones.
+        Returns:
+          - False if there is no saved file, True otherwise
+        """
+        filepath = self.norm_path(checkpoint)
+        if not os.path.isfile(filepath):
+            return False
+        saved = np.load(filepath)
+        shift, scale = saved['shift'], saved['scale']
+        if not (np.array_equal(shift, self.norm_shift)
+                and np.array_equal(scale, self.norm_scale)):
+            for name in ['X_train', 'X_test']:
+                raw = getattr(self, name) * self.norm_scale + self.norm_shift
+                setattr(self, name, np.ascontiguousarray(
+                    (raw - shift) / scale, dtype=np.float32))
+            self.norm_shift, self.norm_scale = shift, scale
+            self.normalization = str(saved['method'])
+        return True
+
+
+    def save_checkpoint(self, global_step, model_path='./mlp/checkpoints/'):
+        """ Save the session and the normalization parameters """
+        m_name = "_".join([self.model_name,
+                           str(self.n_hidden),
+                           str(self.n_node)])
+        kept = list(self.saver.last_checkpoints)
+        self.saver.save(self.sess, model_path + m_name,
+                        global_step = global_step)
+        self.global_step = global_step
+        checkpoint = model_path + m_name + '-' + str(global_step)
+        self.save_norm(checkpoint)
+        if self.sweep_index is not None:
+            self.sweep_index.add_checkpoint(self.model_name, self.n_hidden,
+                                            self.n_node, global_step,
+                                            checkpoint)
+        # Checkpoints deleted by the saver because of 'max_to_keep'
+        for pruned in set(kept) - set(self.saver.last_checkpoints):
+            if os.path.isfile(self.norm_path(pruned)):
+                os.remove(self.norm_path(pruned))
+            if self.sweep_index is not None:
+                self.sweep_index.remove_checkpoint(pruned)
+
+
+    def new_session(self):
+        """ Tensorflow session limited to the thread budget of the model """
+        if self.cpus is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, self.cpus)
+        config = tf.ConfigProto(
+            intra_op_parallelism_threads=self.n_threads or 0,
+            inter_op_parallelism_threads=self.n_inter_threads or 0)
+        return tf.Session(config=config)
 
 
     def new_model(self):
@@ -377,12 +481,13 @@ class Mlp(object):
         self.y = y
         self.cross_entropy = cross_entropy
         self.train_step = train_step
-        self.sess = tf.Session()
+        self.sess = self.new_session()
         self.sess.run(tf.global_variables_initializer())
         self.saver = tf.train.Saver(max_to_keep=self.max_to_keep)
 
 
-    def continue_model(self, meta_name, model_path='./mlp/checkpoints/'):
+    def continue_model(self, meta_name, model_path='./mlp/checkpoints/',
+                       checkpoint=None):
         """ Load from the lastest checkpoint from 'model_path'
         Input:
           - @meta_name: str
@@ -390,6 +495,10 @@ class Mlp(object):
                E.X.: 'model-100' if the '.meta' file is named 'model-100.meta'
           - @model_path: str, default './mlp/checkpoints/'
                Path to the checkpoint directory.
+          - @checkpoint: str, default None
+               Prefix of the checkpoint to restore under 'model_path',
+                 e.g. 'model-100'. If None, the latest checkpoint of
+                 'model_path' is restored.
         """
         # Resume from the checkpoint
         self.saver = tf.train.import_meta_graph(model_path
@@ -445,11 +554,44 @@ class Mlp(object):
         self.y = y
         self.cross_entropy = cross_entropy
         self.train_step = train_step
-        self.sess = tf.Session()
-        self.saver.restore(self.sess, tf.train.latest_checkpoint(model_path))
+        self.sess = self.new_session()
+        if checkpoint is None:
+            checkpoint = tf.train.latest_checkpoint(model_path)
+        else:
+            checkpoint = model_path + checkpoint
+        self.saver.restore(self.sess, checkpoint)
+        # Checkpoints are saved as '[prefix]-[global step]'; the step is
+        #   unknown for a prefix saved without one
+        step = os.path.basename(checkpoint).rsplit('-', 1)
+        self.global_step = (int(step[1]) if len(step) == 2 and step[1].isdigit()
+                            else None)
+        self.load_norm(checkpoint)
+
+
+    def normalize(self, mtx_in):
+        """ Normalize raw features the same way as the dataset
+        Input:
+          - @mtx_in: np.array
+               Matrix with 'n_feat' columns of raw features.
+        Returns:
+          - The normalized matrix
+        """
+        return (np.asarray(mtx_in) - self.norm_shift) / self.norm_scale
 
 
-    def predict(self, mtx_in, mtx_rst=None):
+    def predict_proba(self, mtx_in):
+        """ Probability of the output being 1 for every row of 'mtx_in'
+        Input:
+          - @mtx_in: np.matrix
+               The (normalized) input matrix
+        Returns:
+          - 1-D matrix with the output of the sigmoid
+        """
+        mtx_in = np.ascontiguousarray(mtx_in, dtype=np.float32)
+        return self.sess.run(self.y['out'], feed_dict={self.X: mtx_in})
+
+
+    def predict(self, mtx_in, mtx_rst=None, raw=False):
         """ Make predictions on 'X' with current model.
 
             Accuracy will also be printed given if 'mtx_rst' is not None.
@@ -458,11 +600,15 @@ class Mlp(object):
                The input matrix
           - @mtx_rst: np.matrix, default None
                1-D np.matrix with actual output.
+          - @raw: boolean, default False
+               Flag for whether 'mtx_in' holds raw features to be normalized
+                 with the parameters of the training set.
         Returns:
           - 1-D matrix with prediction using the model
         """
-        Y_pred = self.sess.run(self.y['out'], feed_dict={self.X: mtx_in})
-        Y_pred = Y_pred.round()
+        if raw:
+            mtx_in = self.normalize(mtx_in)
+        Y_pred = self.predict_proba(mtx_in).round()
 
         if mtx_rst is not None:
             acc = tf.reduce_mean(tf.cast(tf.equal(Y_pred, mtx_rst),
@@ -511,11 +657,7 @@ class Mlp(object):
                                                          acc_tr, acc_ts))
 
                 if epoch % self.intvl_save == 0:
-                    m_name = "_".join([self.model_name,
-                                       str(self.n_hidden),
-                                       str(self.n_node)])
-                    self.saver.save(self.sess, "./mlp/checkpoints/" + m_name,
-                                    global_step = epoch)
+                    self.save_checkpoint(epoch)
                     print("\u001B[33m#### Session Saved @ epoch "
                           "{} ####\u001b[0m".format(epoch))
 
@@ -528,16 +670,89 @@ class Mlp(object):
             acc_tr, acc_ts = self.get_acc()
             self.write_pts_csv(writer, self.n_epoch, acc_tr, acc_ts)
             print("{}\t{:.4f}\t   {:.4f}".format(self.n_epoch, acc_tr, acc_ts))
-            m_name = "_".join([self.model_name,
-                               str(self.n_hidden),
-                               str(self.n_node)])
             if self.n_epoch > self.intvl_save:
-                self.saver.save(self.sess, "./mlp/checkpoints/" + m_name,
-                                global_step = self.n_epoch)
+                self.save_checkpoint(self.n_epoch)
                 print("\u001B[33m#### Session Saved @ epoch "
                       "{} ####\u001b[0m".format(self.n_epoch))
 
 
+    def update_model(self, X_new, Y_new, n_epoch=1, max_steps=None,
+                     n_replay=0, raw=True, append=True, save=True,
+                     global_step=None):
+        """ Train the current model on new rows only.
+
+            Each epoch runs one update step per new row, plus one per row of
+              a replay buffer of 'n_replay' rows drawn from the current
+              training set, in random order.
+        Input:
+          - @X_new: np.array
+               Features of the new rows.
+          - @Y_new: np.array
+               Outputs of the new rows (1-D or 1 column).
+          - @n_epoch: int, default 1
+               Number of passes over the new (and replayed) rows.
+          - @max_steps: int, default None
+               Maximum number of update steps; no limit if None.
+          - @n_replay: int, default 0
+               Number of older training rows mixed with the new rows to
+                 limit forgetting.
+          - @raw: boolean, default True
+               Flag for whether 'X_new' has to be normalized with
+                 normalize().
+          - @append: boolean, default True
+               Flag for whether to add the new rows to the training set.
+          - @save: boolean, default True
+               Flag for whether to save a checkpoint after the update.
+          - @global_step: int, default None
+               Step of the saved checkpoint. If None, 1 plus the step of the
+                 last checkpoint saved or restored ('n_epoch' if there is
+                 none), so that updates in later runs do not overwrite the
+                 checkpoints of earlier ones. The step also seeds the RNG
+                 of the replay buffer and of the order of the rows.
+        Returns:
+          - Number of update steps run
+        """
+        X_new = np.asarray(X_new, dtype=np.float64).reshape(-1, self.n_feat)
+        if raw:
+            X_new = self.normalize(X_new)
+        X_new = np.ascontiguousarray(X_new, dtype=np.float32)
+        Y_new = np.ascontiguousarray(Y_new, dtype=np.float32).reshape(-1, 1)
+
+        if global_step is None:
+            last_step = (self.global_step if self.global_step is not None
+                         else self.n_epoch)
+            global_step = last_step + 1
+        rng = np.random.RandomState([self.seed, global_step, self.n_update])
+        X_step, Y_step = X_new, Y_new
+        if n_replay > 0 and self.X_train.shape[0] > 0:
+            idx = rng.choice(self.X_train.shape[0],
+                             min(n_replay, self.X_train.shape[0]),
+                             replace=False)
+            X_step = np.vstack([X_new, self.X_train[idx]])
+            Y_step = np.vstack([Y_new, self.Y_train[idx]])
+
+        n_step = 0
+        for epoch in range(n_epoch):
+            for i in rng.permutation(X_step.shape[0]):
+                if max_steps is not None and n_step >= max_steps:
+                    break
+                self.sess.run(self.train_step,
+                              feed_dict={self.X: X_step[i, None],
+                                         self.Y: Y_step[i, None]})
+                n_step += 1
+
+        if append:
+            self.X_train = np.vstack([self.X_train, X_new])
+            self.Y_train = np.vstack([self.Y_train, Y_new])
+        self.n_update += 1
+
+        if save:
+            self.save_checkpoint(global_step)
+            print("\u001B[33m#### Session Saved @ step "
+                  "{} ####\u001b[0m".format(global_step))
+        return n_step
+
+
     def get_acc(self):
         """Get training and testing accuracy
         Returns:
@@ -662,3 +877,6 @@ class Mlp(object):
         # Add accuracy, too
         line += [acc_tr, acc_ts]
         writer.writerow(line)
+        if self.sweep_index is not None:
+            self.sweep_index.add_point(self.model_name, self.n_hidden,
+                                       self.n_node, epoch, acc_tr, acc_ts)
@@ -0,0 +1,166 @@
+""" Share the cores of one computer between concurrent Mlp trainings
+
+    Every Tensorflow session sizes its thread pools to all the cores by
+      default, so several trainings on the same computer oversubscribe the
+      CPU. Here the cores are split into 'n_concurrent' disjoint slots; a
+      training runs in its own process, pinned to the cores of a free slot,
+      with a session using as many threads as the slot has cores.
+
+    Usage (from the top directory):
+
+      $ python3 -m mlp.scheduler jobs.json -n 4
+
+    where 'jobs.json' is a list of trainings, e.g.
+
+      [{"mlp": {"model_name": "NCAA", "n_feat": 42, "n_hidden": 1,
+                "n_node": 5, "n_epoch": 100, "n_train": 70000,
+                "pathToDataset": "./NCAA_data/pre_game_teams.csv"}},
+       {"mlp": {...}, "meta_name": "NCAA_2_5-100", "epoch_start": 101}]
+
+    or, from Python, a local grid search:
+
+      >>> from mlp.scheduler import grid_jobs, run
+      >>> run(grid_jobs({'model_name': 'NCAA', 'n_feat': 42, 'n_epoch': 100,
+      ...                'n_train': 70000,
+      ...                'pathToDataset': './NCAA_data/pre_game_teams.csv'}),
+      ...     n_concurrent=4)
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from multiprocessing.connection import wait
+
+
+def available_cpus():
+    """ CPUs this process may run on """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(multiprocessing.cpu_count()))
+
+
+def split_cpus(n_slots, cpus=None):
+    """ Split 'cpus' (all available CPUs by default) into 'n_slots' disjoint
+        lists of consecutive CPUs whose sizes differ by at most one """
+    if cpus is None:
+        cpus = available_cpus()
+    n_slots = max(1, min(n_slots, len(cpus)))
+    size, extra = divmod(len(cpus), n_slots)
+    slots = []
+    start = 0
+    for i in range(n_slots):
+        end = start + size + (1 if i < extra else 0)
+        slots.append(list(cpus[start:end]))
+        start = end
+    return slots
+
+
+def thread_budget(cpus, pin=True):
+    """ Mlp() keyword arguments of a training running on 'cpus' """
+    return {'n_threads': len(cpus),
+            'n_inter_threads': min(2, len(cpus)),
+            'cpus': list(cpus) if pin else None}
+
+
+def grid_jobs(mlp, n_grid_layer=4, n_grid_neuron=6):
+    """ Jobs of the grid search of parallel_csif_grid_search() on this
+        computer; 'mlp' holds the Mlp() arguments shared by every job """
+    jobs = []
+    for n_hidden in range(n_grid_layer):
+        for n_node in range(1, n_grid_neuron + 1):
+            jobs.append({'mlp': dict(mlp, n_hidden=n_hidden, n_node=n_node)})
+            # Don't need to do for every hidden node when there's no hidden
+            #   layer
+            if n_hidden == 0:
+                break
+    return jobs
+
+
+def job_name(job):
+    mlp = job['mlp']
+    return '_'.join([mlp['model_name'], str(mlp['n_hidden']),
+                     str(mlp['n_node'])])
+
+
+def train_job(job, budget):
+    """ Train a job in the current process with a thread budget """
+    from mlp.mlp import Mlp
+
+    m = Mlp(**dict(job['mlp'], **budget))
+    if job.get('meta_name'):
+        m.continue_model(job['meta_name'],
+                         job.get('model_path', './mlp/checkpoints/'))
+    else:
+        m.new_model()
+    m.train_model(epoch_start=job.get('epoch_start', 0))
+
+
+def run(jobs, n_concurrent=None, cpus=None, pin=True):
+    """ Run trainings, at most 'n_concurrent' at the same time
+
+    Input:
+      - @jobs: list of dict
+           'mlp': Mlp() keyword arguments; optional 'meta_name',
+             'model_path' and 'epoch_start' to continue a saved model.
+      - @n_concurrent: int, default None
+           Number of trainings at the same time; one per 2 cores if None.
+      - @cpus: list of int, default None
+           CPUs to use; all available CPUs if None.
+      - @pin: boolean, default True
+           Flag for whether to pin each training to the CPUs of its slot.
+    Returns:
+      - dict of job name -> (status, seconds)
+    """
+    if cpus is None:
+        cpus = available_cpus()
+    if n_concurrent is None:
+        n_concurrent = max(1, len(cpus) // 2)
+    free = split_cpus(n_concurrent, cpus)
+    pending = list(jobs)
+    running = {}
+    report = {}
+    while pending or running:
+        while pending and free:
+            job = pending.pop(0)
+            slot = free.pop(0)
+            name = job_name(job)
+            print('[{}] running on CPUs {}'.format(name, slot))
+            process = multiprocessing.Process(
+                target=train_job, args=(job, thread_budget(slot, pin)),
+                name=name)
+            process.start()
+            running[process.sentinel] = (name, process, slot, time.time())
+
+        for sentinel in wait(list(running)):
+            name, process, slot, start = running.pop(sentinel)
+            process.join()
+            free.append(slot)
+            elapsed = time.time() - start
+            status = 'done' if process.exitcode == 0 else 'failed'
+            report[name] = (status, elapsed)
+            print('[{}] {} in {:.1f}s'.format(name, status, elapsed))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Mlp trainings '
+                                                 'concurrently on this '
+                                                 'computer')
+    parser.add_argument('jobs', help='JSON list of trainings')
+    parser.add_argument('-n', '--concurrent', type=int, default=None,
+                        help='trainings at the same time '
+                             '(default: one per 2 cores)')
+    parser.add_argument('--no-pin', action='store_true',
+                        help='do not pin trainings to their CPUs')
+    args = parser.parse_args()
+
+    with open(args.jobs, 'r') as f:
+        jobs = json.load(f)
+    report = run(jobs, args.concurrent, pin=not args.no_pin)
+    if any(status != 'done' for status, _ in report.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
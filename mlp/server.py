@@ -0,0 +1,254 @@
+""" Local prediction server for trained Mlp models
+
+    Models are restored once at start-up. Concurrent requests for the same
+      model are collected into micro-batches: a batch is run as soon as it
+      holds 'max_batch' rows or 'max_wait' seconds after its first request,
+      whichever comes first, with a single forward pass.
+
+    Protocol: one JSON object per line, over TCP or a Unix socket.
+
+      {"model": "NCAA_1_5", "rows": [[42 raw features], ...]}
+        -> {"proba": [p, ...]}
+      {"cmd": "stats"}
+        -> {"NCAA_1_5": {"requests": ..., "p50_ms": ..., ...}}
+
+    Usage (from the top directory):
+
+      $ python3 -m mlp.server models.json --unix /tmp/mlp.sock
+
+    where 'models.json' is a list of models to load, e.g.
+
+      [{"name": "NCAA_1_5", "meta_name": "NCAA_1_5-100",
+        "mlp": {"model_name": "NCAA", "n_feat": 42, "n_hidden": 1,
+                "n_node": 5, "n_epoch": 100, "n_train": 70000,
+                "pathToDataset": "./NCAA_data/pre_game_teams.csv"}}]
+"""
+import json
+import time
+import asyncio
+import argparse
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+def load_model(mlp, meta_name, model_path='./mlp/checkpoints/',
+               checkpoint=None):
+    """ Restore a trained Mlp in its own graph and session
+
+    Input:
+      - @mlp: dict
+           Keyword arguments of Mlp(); the same as used for training.
+      - @meta_name, @model_path, @checkpoint:
+           Arguments of Mlp.continue_model().
+    Returns:
+      - A function mapping a matrix of raw features to the probabilities
+          of the output being 1, and the number of features it expects
+    """
+    import tensorflow as tf
+    from mlp.mlp import Mlp
+
+    with tf.Graph().as_default():
+        m = Mlp(**mlp)
+        m.continue_model(meta_name, model_path, checkpoint)
+
+    def predict(X):
+        X = m.normalize(X).astype(np.float32)
+        return m.predict_proba(X).ravel()
+
+    return predict, m.n_feat
+
+
+class Stats(object):
+    """ Latency and throughput counters of a model """
+    def __init__(self, n_latency=10000):
+        self.start = time.time()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.latency = collections.deque(maxlen=n_latency)
+
+    def summary(self):
+        elapsed = time.time() - self.start
+        lat = np.array(self.latency) * 1000.0
+        return {'requests': self.requests,
+                'rows': self.rows,
+                'batches': self.batches,
+                'errors': self.errors,
+                'mean_batch_rows': self.rows / float(max(self.batches, 1)),
+                'rows_per_s': self.rows / elapsed,
+                'requests_per_s': self.requests / elapsed,
+                'p50_ms': float(np.percentile(lat, 50)) if lat.size else None,
+                'p99_ms': float(np.percentile(lat, 99)) if lat.size else None}
+
+
+class Batcher(object):
+    def __init__(self, predict, max_batch=512, max_wait=0.002,
+                 executor=None):
+        """ Micro-batching in front of a prediction function
+        Input:
+          - @predict: function
+               Maps an n x n_feat matrix to n probabilities.
+          - @max_batch: int, default 512
+               Maximum number of rows in a batch.
+          - @max_wait: float, default 0.002
+               Maximum time in seconds a request waits for other requests.
+          - @executor: concurrent.futures.Executor, default None
+               Where the forward passes run, so that the event loop keeps
+                 accepting requests meanwhile.
+        """
+        self.predict_fn = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = executor
+        self.queue = asyncio.Queue()
+        self.stats = Stats()
+
+    async def predict(self, rows):
+        """ Probabilities of 'rows', computed with the rows of other
+            concurrent requests """
+        start = time.time()
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((rows, future))
+        try:
+            return await future
+        finally:
+            self.stats.requests += 1
+            self.stats.latency.append(time.time() - start)
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self.queue.get()]
+            n_rows = batch[0][0].shape[0]
+            deadline = loop.time() + self.max_wait
+            while n_rows < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                n_rows += item[0].shape[0]
+
+            try:
+                X = np.concatenate([rows for rows, _ in batch])
+                proba = await loop.run_in_executor(self.executor,
+                                                   self.predict_fn, X)
+                if proba.shape[0] != n_rows:
+                    raise ValueError('{} probabilities for {} rows'.format(
+                        proba.shape[0], n_rows))
+            except Exception as e:
+                # Only the requests of this batch fail
+                self.stats.errors += len(batch)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats.batches += 1
+            self.stats.rows += n_rows
+            i = 0
+            for rows, future in batch:
+                if not future.done():
+                    future.set_result(proba[i:i + rows.shape[0]])
+                i += rows.shape[0]
+
+
+class PredictionServer(object):
+    def __init__(self, models, max_batch=512, max_wait=0.002):
+        """ Serve several models
+        Input:
+          - @models: dict
+               Model name -> (prediction function (see Batcher), number of
+                 features), as returned by load_model().
+          - @max_batch, @max_wait:
+               See Batcher.
+        """
+        # One thread per model: a session runs one batch at a time
+        self.executor = ThreadPoolExecutor(max(len(models), 1))
+        self.batchers = {name: Batcher(predict, max_batch, max_wait,
+                                       self.executor)
+                         for name, (predict, _) in models.items()}
+        self.n_feat = {name: n_feat for name, (_, n_feat) in models.items()}
+
+    async def handle_request(self, request):
+        if request.get('cmd') == 'stats':
+            return {name: b.stats.summary()
+                    for name, b in self.batchers.items()}
+        batcher = self.batchers.get(request.get('model'))
+        if batcher is None:
+            return {'error': 'unknown model: ' + str(request.get('model'))}
+        n_feat = self.n_feat[request['model']]
+        rows = request.get('rows')
+        if isinstance(rows, list):
+            rows = np.array(rows, dtype=np.float64)
+        if (not isinstance(rows, np.ndarray) or rows.ndim != 2
+                or rows.shape[0] == 0 or rows.shape[1] != n_feat
+                or not np.isfinite(rows).all()):
+            return {'error': 'rows must be a non-empty list of rows of {} '
+                             'finite features'.format(n_feat)}
+        proba = await batcher.predict(rows)
+        return {'proba': proba.tolist()}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except Exception as e:
+                    response = {'error': repr(e)}
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8765, unix_path=None):
+        """ Start the batchers and listen; returns the asyncio server """
+        for batcher in self.batchers.values():
+            asyncio.ensure_future(batcher.run())
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle, unix_path)
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve trained Mlp models')
+    parser.add_argument('config', help='JSON list of models to load')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help='Unix socket path; '
+                                                     'overrides host/port')
+    parser.add_argument('--max-batch', type=int, default=512)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        specs = json.load(f)
+    models = {}
+    for spec in specs:
+        spec = dict(spec)
+        name = spec.pop('name')
+        models[name] = load_model(**spec)
+        print('Loaded', name)
+
+    server = PredictionServer(models, args.max_batch,
+                              args.max_wait_ms / 1000.0)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(server.start(args.host, args.port, args.unix))
+    print('Listening on', args.unix or '{}:{}'.format(args.host, args.port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+""" SQLite index of the results of grid searches
+
+    Mlp(..., sweep_index='./mlp/datapoints/sweep.db') records in the index
+      the accuracy of every row it writes to '/mlp/datapoints/*.csv' and the
+      step of every checkpoint it saves, so that the best runs of a sweep can
+      be found without reading every CSV file. An index of runs trained
+      without it can be built from the existing files with rebuild().
+
+    Usage (from the top directory):
+
+      $ python3 -m mlp.sweep_index rebuild NCAA
+      $ python3 -m mlp.sweep_index best NCAA
+      $ python3 -m mlp.sweep_index epoch NCAA 100
+"""
+import os
+import glob
+import sqlite3
+import argparse
+import pandas as pd
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    model_name TEXT NOT NULL,
+    n_hidden INTEGER NOT NULL,
+    n_node INTEGER NOT NULL,
+    UNIQUE (model_name, n_hidden, n_node)
+);
+CREATE TABLE IF NOT EXISTS points (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    epoch INTEGER NOT NULL,
+    training_acc REAL,
+    testing_acc REAL,
+    PRIMARY KEY (run_id, epoch)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    step INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (run_id, step)
+);
+CREATE INDEX IF NOT EXISTS points_epoch ON points (epoch);
+"""
+
+# Best row of every run, with the path of its checkpoint if there is one
+BEST = """
+SELECT n_hidden, n_node, epoch, training_acc, testing_acc, checkpoint
+FROM (SELECT r.n_hidden, r.n_node, p.epoch, p.training_acc, p.testing_acc,
+             c.path AS checkpoint,
+             ROW_NUMBER() OVER (PARTITION BY p.run_id
+                                ORDER BY p.testing_acc DESC, p.epoch) AS rank
+      FROM points p
+      JOIN runs r ON r.run_id = p.run_id
+      {join} checkpoints c ON c.run_id = p.run_id AND c.step = p.epoch
+      WHERE r.model_name = ?)
+WHERE rank = 1
+ORDER BY testing_acc DESC
+"""
+
+columns = ['n_hidden', 'n_node', 'epoch', 'training_acc', 'testing_acc',
+           'checkpoint']
+
+
+def find_runs(model_name, datapoints_dir='./mlp/datapoints/'):
+    """ Runs of 'model_name' with a '[model name]_[# of hidden layers]_[# of
+        neurons]_[compact/detailed].csv' file under 'datapoints_dir'
+
+    Returns:
+      - dict of (n_hidden, n_node) -> list of paths of the files of the run
+    """
+    runs = {}
+    for filepath in glob.glob(os.path.join(datapoints_dir,
+                                           model_name + '_*_*_*.csv')):
+        parts = os.path.basename(filepath).split('_')
+        try:
+            n_hidden, n_node = int(parts[-3]), int(parts[-2])
+        except ValueError:
+            continue
+        # Make sure the prefix is exactly the model name
+        if '_'.join(parts[:-3]) != model_name:
+            continue
+        runs.setdefault((n_hidden, n_node), []).append(filepath)
+    return runs
+
+
+class SweepIndex(object):
+    def __init__(self, path='./mlp/datapoints/sweep.db'):
+        """ Open (or create) the index at 'path'
+
+        Several trainings may write to the same index at the same time.
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self.run_ids = {}
+
+    def __getstate__(self):
+        # Reopened by the processes it is sent to
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def close(self):
+        self.conn.close()
+
+    def run_id(self, model_name, n_hidden, n_node):
+        key = (model_name, int(n_hidden), int(n_node))
+        if key not in self.run_ids:
+            with self.conn:
+                self.conn.execute('INSERT OR IGNORE INTO runs (model_name, '
+                                  'n_hidden, n_node) VALUES (?, ?, ?)', key)
+            self.run_ids[key] = self.conn.execute(
+                'SELECT run_id FROM runs WHERE model_name = ? AND '
+                'n_hidden = ? AND n_node = ?', key).fetchone()[0]
+        return self.run_ids[key]
+
+    def add_point(self, model_name, n_hidden, n_node, epoch, training_acc,
+                  testing_acc):
+        """ Record the accuracy of a run at 'epoch' """
+        run_id = self.run_id(model_name, n_hidden, n_node)
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO points VALUES '
+                              '(?, ?, ?, ?)',
+                              (run_id, int(epoch), float(training_acc),
+                               float(testing_acc)))
+
+    def add_checkpoint(self, model_name, n_hidden, n_node, step, path):
+        """ Record that the checkpoint of a run at 'step' is at 'path', the
+            prefix given to Saver.restore() """
+        run_id = self.run_id(model_name, n_hidden, n_node)
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO checkpoints VALUES '
+                              '(?, ?, ?)', (run_id, int(step), path))
+
+    def remove_checkpoint(self, path):
+        """ Forget the checkpoint at 'path', e.g. after the Saver deleted it """
+        with self.conn:
+            self.conn.execute('DELETE FROM checkpoints WHERE path = ?',
+                              (path,))
+
+    def prune(self, model_name):
+        """ Forget the checkpoints of 'model_name' whose files no longer
+            exist, e.g. deleted by a Saver with 'max_to_keep' in a run that
+            did not record it """
+        rows = self.conn.execute('SELECT c.path FROM checkpoints c '
+                                 'JOIN runs r ON r.run_id = c.run_id '
+                                 'WHERE r.model_name = ?',
+                                 (model_name,)).fetchall()
+        missing = [(path,) for path, in rows
+                   if not os.path.isfile(path + '.index')]
+        if missing:
+            with self.conn:
+                self.conn.executemany('DELETE FROM checkpoints WHERE '
+                                      'path = ?', missing)
+
+    def best(self, model_name, restorable=True):
+        """ Best epoch of every run of 'model_name'
+
+        Input:
+          - @model_name: str
+          - @restorable: boolean, default True
+               Flag for whether to only consider epochs with a checkpoint.
+        Returns:
+          - pd.DataFrame with columns n_hidden, n_node, epoch, training_acc,
+              testing_acc and checkpoint, sorted by decreasing testing
+              accuracy, as mlp.ensemble.sweep_results()
+        """
+        self.prune(model_name)
+        query = BEST.format(join='JOIN' if restorable else 'LEFT JOIN')
+        return pd.DataFrame(self.conn.execute(query, (model_name,))
+                                .fetchall(), columns=columns)
+
+    def at_epoch(self, model_name, epoch):
+        """ Accuracy of every run of 'model_name' at 'epoch' """
+        self.prune(model_name)
+        rows = self.conn.execute(
+            'SELECT r.n_hidden, r.n_node, p.epoch, p.training_acc, '
+            'p.testing_acc, c.path FROM points p '
+            'JOIN runs r ON r.run_id = p.run_id '
+            'LEFT JOIN checkpoints c ON c.run_id = p.run_id '
+            'AND c.step = p.epoch '
+            'WHERE r.model_name = ? AND p.epoch = ? '
+            'ORDER BY p.testing_acc DESC',
+            (model_name, int(epoch))).fetchall()
+        return pd.DataFrame(rows, columns=columns)
+
+    def checkpoint(self, model_name, n_hidden, n_node, step=None):
+        """ Checkpoint prefix of a run at 'step', or of its best epoch with a
+            checkpoint if 'step' is None; None if there is none """
+        self.prune(model_name)
+        if step is None:
+            row = self.conn.execute(
+                'SELECT c.path FROM points p '
+                'JOIN runs r ON r.run_id = p.run_id '
+                'JOIN checkpoints c ON c.run_id = p.run_id '
+                'AND c.step = p.epoch '
+                'WHERE r.model_name = ? AND r.n_hidden = ? AND r.n_node = ? '
+                'ORDER BY p.testing_acc DESC, p.epoch LIMIT 1',
+                (model_name, int(n_hidden), int(n_node))).fetchone()
+        else:
+            row = self.conn.execute(
+                'SELECT c.path FROM checkpoints c '
+                'JOIN runs r ON r.run_id = c.run_id '
+                'WHERE r.model_name = ? AND r.n_hidden = ? AND r.n_node = ? '
+                'AND c.step = ?',
+                (model_name, int(n_hidden), int(n_node), int(step))
+            ).fetchone()
+        return row[0] if row else None
+
+    def rebuild(self, model_name, datapoints_dir='./mlp/datapoints/',
+                checkpoints_dir='./mlp/checkpoints/'):
+        """ Index the existing '[model name]_[# of hidden layers]_[# of
+            neurons]_[compact/detailed].csv' files of 'model_name' and their
+            checkpoints, replacing what the index holds for them
+
+        Returns:
+          - Number of runs indexed
+        """
+        runs = find_runs(model_name, datapoints_dir)
+        with self.conn:
+            self.conn.execute('DELETE FROM points WHERE run_id IN (SELECT '
+                              'run_id FROM runs WHERE model_name = ?)',
+                              (model_name,))
+            self.conn.execute('DELETE FROM checkpoints WHERE run_id IN '
+                              '(SELECT run_id FROM runs WHERE model_name = ?)',
+                              (model_name,))
+        for (n_hidden, n_node), files in runs.items():
+            run_id = self.run_id(model_name, n_hidden, n_node)
+            prefix = os.path.join(checkpoints_dir, '_'.join([model_name,
+                                                             str(n_hidden),
+                                                             str(n_node)]))
+            points = []
+            for filepath in files:
+                df = pd.read_csv(filepath, header=0, sep=',', index_col=None,
+                                 usecols=['epoch', 'training_acc',
+                                          'testing_acc'])
+                points += [(run_id, int(e), float(tr), float(ts))
+                           for e, tr, ts in df.itertuples(index=False)]
+            checkpoints = []
+            for index_file in glob.glob(glob.escape(prefix) + '-*.index'):
+                step = index_file[len(prefix) + 1:-len('.index')]
+                if step.isdigit():
+                    checkpoints.append((run_id, int(step),
+                                        index_file[:-len('.index')]))
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO points VALUES '
+                                      '(?, ?, ?, ?)', points)
+                self.conn.executemany('INSERT OR REPLACE INTO checkpoints '
+                                      'VALUES (?, ?, ?)', checkpoints)
+        return len(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query or rebuild the '
+                                                 'sweep index')
+    parser.add_argument('command', choices=['rebuild', 'best', 'epoch'])
+    parser.add_argument('model_name')
+    parser.add_argument('epoch', type=int, nargs='?', default=None)
+    parser.add_argument('--index', default='./mlp/datapoints/sweep.db')
+    parser.add_argument('--datapoints', default='./mlp/datapoints/')
+    parser.add_argument('--checkpoints', default='./mlp/checkpoints/')
+    parser.add_argument('--all', action='store_true',
+                        help='with best, include epochs without checkpoint')
+    args = parser.parse_args()
+
+    index = SweepIndex(args.index)
+    if args.command == 'rebuild':
+        n_runs = index.rebuild(args.model_name, args.datapoints,
+                               args.checkpoints)
+        print('Indexed {} runs of {}'.format(n_runs, args.model_name))
+    elif args.command == 'best':
+        print(index.best(args.model_name, restorable=not args.all)
+                   .to_string(index=False))
+    else:
+        if args.epoch is None:
+            parser.error('epoch is required')
+        print(index.at_epoch(args.model_name, args.epoch)
+                   .to_string(index=False))
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,159 @@
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import hashlib
+import math
 import os
 
 
+def find_plots(rootdir, suffix, exclude=()):
+    """ Find the plots under 'rootdir' whose name ends with 'suffix'
+
+    Input:
+      - @rootdir: str
+           Directory searched recursively.
+      - @suffix: str
+           End of the filenames to keep, e.g. 'accuracy.png'.
+      - @exclude: list of str, default ()
+           Filenames starting with one of these prefixes are left out.
+    Returns:
+      - A sorted list of paths
+    """
+    files = []
+    for dir, subdirs, fs in os.walk(rootdir):
+        for f in fs:
+            if f.endswith(suffix) and not f.startswith(tuple(exclude)):
+                files += [os.path.join(dir, f)]
+    files.sort()
+    return files
+
+
+def grid_shape(n, nrows=None, ncols=None):
+    """ Number of rows and columns of a grid holding 'n' tiles
+
+    If neither is given, the grid is as square as possible.
+    """
+    if nrows is None and ncols is None:
+        ncols = int(math.ceil(math.sqrt(n)))
+    if nrows is None:
+        nrows = int(math.ceil(float(n) / ncols))
+    if ncols is None:
+        ncols = int(math.ceil(float(n) / nrows))
+    return nrows, ncols
+
+
+def thumbnail(filepath, size, cache_dir=None):
+    """ Resize an image, reusing a cached copy if the source is unchanged
+
+    The cached thumbnail is named after the source path, the size and the
+      modification time of the source, so editing a plot invalidates it.
+
+    Input:
+      - @filepath: str
+           Path to the source image.
+      - @size: (int, int)
+           Width and height of the thumbnail.
+      - @cache_dir: str, default None
+           Directory of the cached thumbnails. No caching if None.
+    Returns:
+      - The resized RGB image
+    """
+    if cache_dir is not None:
+        key = '|'.join([os.path.abspath(filepath), str(size),
+                        str(os.stat(filepath).st_mtime)])
+        cache_path = os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8'))
+                                             .hexdigest() + '.png')
+        if os.path.isfile(cache_path):
+            return Image.open(cache_path).convert('RGB')
+
+    img = Image.open(filepath).convert('RGB')
+    img = img.resize(size, Image.LANCZOS)
+
+    if cache_dir is not None:
+        img.save(cache_path)
+    return img
+
+
+def _thumbnail_args(args):
+    return thumbnail(*args)
+
+
+def montage(files, outpath, tile=(800, 600), nrows=None, ncols=None,
+            column_major=False, n_workers=None, processes=False,
+            cache_dir='./report/scripts/.thumbnails'):
+    """ Paste images on a grid and save it
+
+    Input:
+      - @files: list of str
+           Paths to the images, in the order they are placed.
+      - @outpath: str
+           Path to the output image.
+      - @tile: (int, int), default (800, 600)
+           Size each image is resized to.
+      - @nrows, @ncols: int, default None
+           Shape of the grid; see grid_shape().
+      - @column_major: boolean, default False
+           Fill the grid column by column instead of row by row.
+      - @n_workers: int, default None
+           Number of workers resizing the images. None lets
+             concurrent.futures decide.
+      - @processes: boolean, default False
+           Resize in a process pool instead of a thread pool.
+      - @cache_dir: str, default './report/scripts/.thumbnails'
+           Directory of the cached thumbnails. No caching if None.
+    """
+    nrows, ncols = grid_shape(len(files), nrows, ncols)
+    if cache_dir is not None and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    Executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with Executor(n_workers) as executor:
+        imgs = list(executor.map(_thumbnail_args,
+                                 [(f, tuple(tile), cache_dir) for f in files]))
+
+    # Output canvas
+    w, h = tile
+    out = Image.new("RGB", (ncols * w, nrows * h))
+    for i, img in enumerate(imgs):
+        if column_major:
+            col, row = divmod(i, nrows)
+        else:
+            row, col = divmod(i, ncols)
+        x, y = col * w, row * h
+        out.paste(img, (x, y, x + w, y + h))
+
+    out.save(outpath)
+
+
 def combine(type):
     """ Combine plots in /mlp/NCAA_preGame/plots/learningRate10e-1
         Input:
           - @type: either 'accuracy' or 'weights'
     """
     rootdir = './mlp/NCAA_preGame/plots/learningRate10e-1'
-    files = []
-    for dir, subdirs, fs in os.walk(rootdir):
-        for f in fs:
-            if f.split('_')[-1] == type + '.png':
-                files += [os.path.join(dir,f)]
-    fs.sort()
-    fs.remove(fs[0]) # remove NCAA_0_1_compact*
-
-    # Coordinates
-    x = 0
-    y = 0
-    # Output canvas
-    out = Image.new("RGB", (2400, 3600))
-
-    for i in range(len(files)):
-        img = Image.open(files[i])
-        img = img.resize([800, 600], Image.ANTIALIAS)
-        if i % 6 == 0 and i != 0:
-            x+=800
-        y += 600
-        if i % 6 == 0:
-            y=0
-        w, h = img.size
-        out.paste(img, (x, y, x+w, y+h))
-
-    out.save('./report/images/NCAA_18_' + type + '.jpg')
+    # NCAA_0_1_compact* has no hidden layer and is left out
+    files = find_plots(rootdir, '_' + type + '.png', exclude=['NCAA_0_1_'])
+    montage(files, './report/images/NCAA_18_' + type + '.jpg', nrows=6,
+            column_major=True)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Combine plots on a grid')
+    parser.add_argument('rootdir', help='directory searched for plots')
+    parser.add_argument('suffix', help="end of the filenames, e.g. "
+                                       "'accuracy.png'")
+    parser.add_argument('outpath', help='path to the combined image')
+    parser.add_argument('--exclude', nargs='*', default=[],
+                        help='filename prefixes to leave out')
+    parser.add_argument('--tile', type=int, nargs=2, default=[800, 600])
+    parser.add_argument('--rows', type=int, default=None)
+    parser.add_argument('--cols', type=int, default=None)
+    parser.add_argument('--column-major', action='store_true')
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    parser.add_argument('--processes', action='store_true')
+    args = parser.parse_args()
+
+    montage(find_plots(args.rootdir, args.suffix, args.exclude), args.outpath,
+            args.tile, args.rows, args.cols, args.column_major, args.jobs,
+            args.processes)